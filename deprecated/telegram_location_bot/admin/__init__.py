@@ -1,8 +1,16 @@
-"""Initialize Flask blueprint for admin routes."""
-from flask import Blueprint
+"""Initialize Flask blueprint for admin routes.
 
-# Create blueprint for admin routes
-admin_bp = Blueprint('admin_bp', __name__, template_folder='../templates/admin')
+The blueprint is created the first time ``admin.admin_bp`` is accessed, so
+bot processes that only import ``admin.models`` do not load Flask or the
+admin routes.
+"""
 
-# Import routes to register them with the blueprint
-from admin import routes  # noqa: E402,F401
+def __getattr__(name):
+    if name == 'admin_bp':
+        from flask import Blueprint
+        # Create blueprint for admin routes (bound before importing routes, which use it)
+        globals()['admin_bp'] = Blueprint('admin_bp', __name__, template_folder='../templates/admin')
+        # Import routes to register them with the blueprint
+        from admin import routes  # noqa: F401
+        return globals()['admin_bp']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,87 @@
 # models.py
 """Database models for users and locations."""
-from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Text, Date, DateTime, ForeignKey
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
 Base = declarative_base()
 
-# Deprecate Flask models
-# These models are redundant with Supabase tables and are no longer needed.
-# class User(Base):
-#     pass
-#
-# class Location(Base):
-#     pass
+# The users and locations tables are owned by Supabase; these mappings only
+# describe the columns the bot and admin panel use. create_all() leaves the
+# existing tables alone and creates them for local SQLite databases.
+class User(Base):
+    """A bot user or admin panel account."""
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(BigInteger, unique=True, index=True)
+    username = Column(String(64))
+    first_name = Column(String(64))
+    last_name = Column(String(64))
+    is_admin = Column(Boolean, default=False)
+    is_active = Column(Boolean, default=True)
+    password_hash = Column(String(256))
+    totp_secret = Column(String(32))
+    locations = relationship('Location', back_populates='user')
+
+class Location(Base):
+    """A contact location, or a logged search when ``query`` is set."""
+    __tablename__ = 'locations'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    latitude = Column(String(64))
+    longitude = Column(String(64))
+    address = Column(Text)
+    query = Column(Text)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    user = relationship('User', back_populates='locations')
+
+class AuthVersion(Base):
+    """Version counters bumped whenever authorization data changes.
+
+    Processes cache role data in memory and compare these counters on a
+    throttle to learn about changes made by other processes.
+    """
+    __tablename__ = 'auth_versions'
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class DataVersion(Base):
+    """Version counters for cached copies of shared data (e.g. the contact snapshot).
+
+    Writers bump a counter when the data changes; readers compare it on a
+    throttle and rebuild their cache when it moved.
+    """
+    __tablename__ = 'data_versions'
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class AnalysisResult(Base):
+    """Text analysis results from Loveable.dev, written in batches by bot.analysis."""
+    __tablename__ = 'analysis_results'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    text = Column(Text)
+    sentiment = Column(String(32))
+    details = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class SentimentRollup(Base):
+    """Analysis result counts per time bucket and sentiment, kept up to date by bot.rollups."""
+    __tablename__ = 'sentiment_rollups'
+    granularity = Column(String(8), primary_key=True)  # 'hour' or 'day'
+    bucket_start = Column(DateTime, primary_key=True)
+    sentiment = Column(String(32), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class LocationDailyStat(Base):
+    """Per-day, per-user search counts for location history moved to the archive by bot.retention."""
+    __tablename__ = 'location_daily_stats'
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    searches = Column(Integer, nullable=False, default=0)
+
+class UserActivity(Base):
+    """When the bot last saw each user, maintained by bot.user_directory."""
+    __tablename__ = 'user_activity'
+    user_id = Column(Integer, primary_key=True)
+    last_seen_at = Column(DateTime, index=True)
@@ -1,12 +1,10 @@
 """Flask routes for admin panel pages."""
 from flask import render_template, request, redirect, url_for, session, flash
 from admin import admin_bp
-from bot.auth import authenticate_user, verify_totp, login_required
+from bot.auth import authenticate_user, verify_totp, login_required, start_admin_session
 from admin.models import User, Location
 import pyotp
-import sqlite3
-
-DB_PATH = 'path_to_your_database.db'
+from datetime import datetime, timedelta
 
 # Define constants for route names
 ADMIN_BP_LOGIN = 'admin_bp.login'
@@ -33,7 +31,7 @@ def login():
             return redirect(url_for(ADMIN_BP_VERIFY_2FA))
         else:
             # No 2FA, log in directly
-            session['user_id'] = user.id
+            start_admin_session(user)
             flash("Welcome, {}!".format(user.username or user.first_name), "success")
             return redirect(url_for(ADMIN_BP_DASHBOARD))
     # GET request
@@ -69,7 +67,7 @@ def verify_2fa():
         if verify_totp(user, code):
             # 2FA success
             session.pop('pending_user_id', None)
-            session['user_id'] = user.id
+            start_admin_session(user)
             flash("2FA verified. Welcome, {}!".format(user.username or user.first_name), "success")
             return redirect(url_for(ADMIN_BP_DASHBOARD))
         else:
@@ -88,12 +86,14 @@ def logout():
 @login_required
 def dashboard():
     # Fetch some stats to display
-    from bot.database import SessionLocal
-    session_db = SessionLocal()
+    from bot.database import ReadSessionLocal
+    from bot import retention
+    session_db = ReadSessionLocal()
     try:
         total_users = session_db.query(User).count()
         admin_count = session_db.query(User).filter(User.is_admin == True).count()
-        location_count = session_db.query(Location).count()
+        # Hot search rows plus daily counts of archived search history
+        location_count = retention.total_searches(session_db)
         # Latest 5 location queries
         recent_locations = session_db.query(Location).order_by(Location.id.desc()).limit(5).all()
         # Optionally, eager load user for each location (since we'll access user)
@@ -108,41 +108,66 @@ def dashboard():
     }
     return render_template('dashboard.html', stats=stats, recent_locations=recent_locations)
 
+# Filter values accepted by the users page, as user_directory.apply_filters arguments
+USER_FLAG_FILTERS = {'yes': True, 'no': False}
+USER_SEEN_FILTERS = {'1': 1, '7': 7, '30': 30}
+USER_FILTER_PARAMS = ('q', 'admin', 'active', 'seen')
+
+def _user_filters(values):
+    filters = {
+        'text': values.get('q') or None,
+        'is_admin': USER_FLAG_FILTERS.get(values.get('admin')),
+        'is_active': USER_FLAG_FILTERS.get(values.get('active')),
+    }
+    seen = values.get('seen')
+    if seen == 'never':
+        filters['never_seen'] = True
+    elif seen in USER_SEEN_FILTERS:
+        filters['seen_since'] = datetime.utcnow() - timedelta(days=USER_SEEN_FILTERS[seen])
+    return filters
+
 @admin_bp.route('/users', methods=['GET', 'POST'])
 @login_required
 def users():
-    def fetch_users():
-        # Logic to fetch users from the database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users")
-        users = cursor.fetchall()
-        conn.close()
-        return users
-
-    def process_user_data(user):
-        # Logic to process individual user data
-        return {
-            "id": user[0],
-            "name": user[1],
-            "email": user[2],
-            "role": user[3]
-        }
-
-    def render_users_page(users):
-        # Logic to render the users page
-        return render_template('admin/users.html', users=users)
-
-    users = fetch_users()
-    processed_users = [process_user_data(user) for user in users]
-    return render_users_page(processed_users)
+    """Searchable, keyset-paginated user directory with batched bulk actions."""
+    from bot.database import ReadSessionLocal
+    from bot import user_directory
+    filter_args = {name: request.values.get(name) for name in USER_FILTER_PARAMS if request.values.get(name)}
+    filters = _user_filters(request.values)
+    if request.method == 'POST':
+        action = request.form.get('action', '')
+        if action not in user_directory.ACTIONS:
+            flash(f"Unknown action: {action}", "danger")
+            return redirect(url_for('admin_bp.users', **filter_args))
+        # Admins can't lock themselves out with a bulk action
+        exclude = {session.get('user_id')}
+        if request.form.get('scope') == 'matching':
+            changed = user_directory.apply_action_to_matching(action, exclude, **filters)
+        else:
+            user_ids = [int(value) for value in request.form.getlist('user_ids') if value.isdigit()]
+            if not user_ids:
+                flash("Select at least one user.", "warning")
+                return redirect(url_for('admin_bp.users', **filter_args))
+            changed = user_directory.apply_action(action, user_ids, exclude)
+        flash(f"{action.capitalize()}: {changed} user(s) updated.", "success")
+        return redirect(url_for('admin_bp.users', **filter_args))
+    after = request.args.get('after', type=int)
+    session_db = ReadSessionLocal()
+    try:
+        rows, next_after = user_directory.search(session_db, after_id=after, **filters)
+    finally:
+        session_db.close()
+    return render_template(
+        'users.html', rows=rows, next_after=next_after, filters=filter_args,
+        actions=list(user_directory.ACTIONS), first_page=not after
+    )
 
 @admin_bp.route('/locations')
 @login_required
 def locations():
     # List all location records
-    from bot.database import SessionLocal
-    session_db = SessionLocal()
+    from bot.database import ReadSessionLocal
+    session_db = ReadSessionLocal()
     try:
         records = session_db.query(Location).order_by(Location.id.desc()).all()
         # Optionally load user info for each location (for template)
@@ -153,12 +178,58 @@ def locations():
     return render_template('locations.html', locations=records)
 
 @admin_bp.route('/analytics/sentiment')
+@login_required
 def sentiment_analytics():
-    """Display sentiment analytics from Loveable.dev."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT sentiment, COUNT(*) FROM analysis_results GROUP BY sentiment")
-    data = cursor.fetchall()
-    conn.close()
+    """Display sentiment analytics from Loveable.dev, served from the rollup tables."""
+    from bot.database import ReadSessionLocal
+    from bot import rollups
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in rollups.GRANULARITIES:
+        granularity = 'day'
+    today = datetime.utcnow().date()
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d')
+    except ValueError:
+        start = datetime.combine(today - timedelta(days=29), datetime.min.time())
+    try:
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d')
+    except ValueError:
+        end = datetime.combine(today, datetime.min.time())
+    if end < start:
+        start, end = end, start
+    session_db = ReadSessionLocal()
+    try:
+        # End date is inclusive in the form
+        data, series = rollups.query(session_db, start, end + timedelta(days=1), granularity)
+    finally:
+        session_db.close()
+    sentiments = [sentiment for sentiment, _ in data]
+    return render_template(
+        'admin/sentiment_analytics.html', data=data, series=series, sentiments=sentiments,
+        granularity=granularity, start=start.strftime('%Y-%m-%d'), end=end.strftime('%Y-%m-%d')
+    )
 
-    return render_template('admin/sentiment_analytics.html', data=data)
+@admin_bp.route('/templates', methods=['GET', 'POST'])
+@login_required
+def reply_templates():
+    """List and edit the bot reply templates."""
+    from bot.template_registry import registry, TemplateError
+    if request.method == 'POST':
+        name = request.form.get('name', '')
+        text = request.form.get('text', '').replace('\r\n', '\n')
+        if name not in registry.names():
+            flash(f"Unknown template: {name}", "danger")
+            return redirect(url_for('admin_bp.reply_templates'))
+        try:
+            registry.save(name, text)
+            flash(f"Template '{name}' saved.", "success")
+        except TemplateError as e:
+            flash(f"Template '{name}' not saved: {e}", "danger")
+        except OSError as e:
+            flash(f"Could not write template '{name}': {e}", "danger")
+        return redirect(url_for('admin_bp.reply_templates'))
+    templates = []
+    for name in registry.names():
+        text, placeholders, path = registry.describe(name)
+        templates.append({'name': name, 'text': text, 'placeholders': placeholders, 'path': path})
+    return render_template('reply_templates.html', templates=templates)
@@ -6,6 +6,7 @@ from flask import Flask, session, redirect, url_for
 
 # Import configuration and bot instance
 from bot import config, bot as telegram_bot
+from bot.bootstrap import bootstrap, format_startup_report
 from admin import admin_bp
 
 # Configure logging to file
@@ -17,6 +18,10 @@ logging.getLogger().addHandler(handler)
 
 logging.info("Starting application...")
 
+# Register handlers and prepare the database (schema/admin can be disabled for workers)
+bootstrap()
+logging.info("Startup timings:\n%s", format_startup_report())
+
 # Initialize Flask app
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.config['SECRET_KEY'] = config.SECRET_KEY
@@ -33,10 +38,22 @@ def index():
     return """<html><head><meta http-equiv='Refresh' content='0; URL=/admin/login'/></head></html>"""
 
 if __name__ == '__main__':
+    # Move old location search history to the archive in the background
+    from bot import retention
+    retention.start_worker()
     # Start Telegram bot in a separate thread
     import threading
     def run_bot():
-        telegram_bot.polling(none_stop=True, timeout=60)
+        if config.BOT_ASYNC:
+            # Asyncio mode: async client, database sessions and HTTP on one event loop
+            from bot import async_runtime
+            async_runtime.run()
+        elif config.BOT_WORKERS > 1:
+            # Multi-process mode: poll here and route updates to worker processes
+            from bot import supervisor
+            supervisor.run(config.BOT_WORKERS, install_signals=False)
+        else:
+            telegram_bot.polling(none_stop=True, timeout=60)
     bot_thread = threading.Thread(target=run_bot)
     bot_thread.daemon = True
     bot_thread.start()
@@ -0,0 +1 @@
+"""Benchmark harness for the Telegram bot (see benchmarks/run.py)."""
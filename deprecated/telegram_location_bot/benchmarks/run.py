@@ -0,0 +1,364 @@
+"""End-to-end benchmark for the bot handlers.
+
+Drives the real handlers in bot/handlers.py and bot/admin_commands.py with a
+synthetic update stream, against a local Telegram Bot API stub, a Nominatim
+stub with tunable latency and a seeded SQLite database.
+
+Usage (from the telegram_location_bot directory):
+    python -m benchmarks.run --users 1000 --contacts 5000 --sessions 200
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --tolerance 0.15
+    python -m benchmarks.run --async --geocode-latency 2 --sessions 2000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.stubs import TelegramStub, NominatimStub, point_bot_at
+
+# Telegram ids of seeded users start here; database ids are kept equal to them
+USER_ID_BASE = 100000
+ADMIN_TELEGRAM_ID = 99999
+PLACES = [
+    "London", "Leeds", "Harrogate", "Harrow", "York", "Bristol", "Manchester",
+    "LS1 4AP", "M1 1AE", "BS1 5TR", "SW1A 1AA", "HG1 2RS", "EH1 1YZ", "CF10 1EP",
+]
+# Text only the admin command handlers reply with, so the admin rows measure the admin path
+ADMIN_REPLIES = {'/stats': "Bot Statistics", '/promote': "Promoted", '/demote': "has been demoted"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Telegram bot handlers end to end.")
+    parser.add_argument('--users', type=int, default=1000, help="number of seeded users")
+    parser.add_argument('--contacts', type=int, default=5000, help="number of seeded contacts (location rows)")
+    parser.add_argument('--sessions', type=int, default=200, help="number of synthetic user sessions")
+    parser.add_argument('--admin-ratio', type=float, default=0.05, help="share of sessions that are admin commands")
+    parser.add_argument('--geocode-latency', type=float, default=0.0, help="stub Nominatim latency in seconds")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for the update stream")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="run through bot.supervisor with this many worker processes (throughput only)")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="run every user's session concurrently on the asyncio runtime (bot.async_runtime)")
+    parser.add_argument('--db', help="SQLite file to use (default: a temporary file)")
+    parser.add_argument('--json', dest='json_path', help="write results as JSON to this path")
+    parser.add_argument('--save-baseline', help="save results as a baseline JSON file")
+    parser.add_argument('--compare', help="compare results against a baseline JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="allowed relative regression before --compare fails (default 0.10)")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, telegram, nominatim):
+    """Point the bot at the stubs and a benchmark database before it is imported."""
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='bot-bench-'), 'bench.db')
+    os.environ['BOT_TOKEN'] = '123456:BENCHMARK'
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ.setdefault('ADMIN_TOTP_SECRET', 'JBSWY3DPEHPK3PXP')
+    # The benchmark measures handler cost, not the per-user throttle
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+
+    point_bot_at(telegram.api_url, nominatim.url)
+
+    from bot.bootstrap import bootstrap
+    bootstrap()
+    return db_path
+
+
+def seed_database(users, contacts, rng):
+    """Insert ``users`` bot users plus one admin, and ``contacts`` location rows."""
+    from bot import database
+    from admin.models import User, Location
+
+    session = database.SessionLocal()
+    try:
+        session.query(Location).delete()
+        session.query(User).filter(User.telegram_id.isnot(None)).delete()
+        session.add(User(
+            id=ADMIN_TELEGRAM_ID, telegram_id=ADMIN_TELEGRAM_ID, username='bench_admin',
+            first_name='Bench', last_name='Admin', is_admin=True, is_active=True,
+        ))
+        session.add_all([
+            User(
+                id=USER_ID_BASE + i, telegram_id=USER_ID_BASE + i, username=f"user{i}",
+                first_name=f"User{i}", last_name='', is_admin=False, is_active=True,
+            )
+            for i in range(users)
+        ])
+        session.flush()
+        session.add_all([
+            Location(
+                user_id=USER_ID_BASE + rng.randrange(users),
+                latitude=round(rng.uniform(50.0, 58.5), 6),
+                longitude=round(rng.uniform(-5.5, 1.7), 6),
+                address=f"Seeded contact {i}",
+            )
+            for i in range(contacts)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def _sender(telegram_id):
+    # Match the seeded rows so ensure_user() does not rewrite them on every update
+    if telegram_id == ADMIN_TELEGRAM_ID:
+        return {'id': telegram_id, 'is_bot': False, 'first_name': 'Bench', 'last_name': 'Admin',
+                'username': 'bench_admin'}
+    index = telegram_id - USER_ID_BASE
+    return {'id': telegram_id, 'is_bot': False, 'first_name': f"User{index}", 'username': f"user{index}"}
+
+
+def _message(update_id, telegram_id, text):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': telegram_id, 'type': 'private'},
+        'from': _sender(telegram_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def build_stream(args, rng):
+    """Return a list of (label, update dict) tuples mixing user and admin sessions."""
+    stream = []
+    update_id = 0
+
+    def add(label, telegram_id, text):
+        nonlocal update_id
+        update_id += 1
+        stream.append((label, _message(update_id, telegram_id, text)))
+
+    for _ in range(args.sessions):
+        if rng.random() < args.admin_ratio:
+            target = USER_ID_BASE + rng.randrange(args.users)
+            add('/stats', ADMIN_TELEGRAM_ID, '/stats')
+            add('/promote', ADMIN_TELEGRAM_ID, f"/promote {target}")
+            add('/demote', ADMIN_TELEGRAM_ID, f"/demote {target}")
+            continue
+        telegram_id = USER_ID_BASE + rng.randrange(args.users)
+        add('/start', telegram_id, '/start')
+        if rng.random() < 0.5:
+            add('/number', telegram_id, '/number')
+            add('number_query', telegram_id, rng.choice(PLACES))
+        else:
+            add('/numbers', telegram_id, '/numbers')
+            add('numbers_query', telegram_id, rng.choice(PLACES))
+    return stream
+
+
+def run_stream(stream):
+    """Dispatch every update synchronously and return per-label latencies in seconds."""
+    from telebot.types import Update
+    from bot import bot as telegram_bot
+
+    # Run handlers inline so each update's latency can be measured on its own
+    telegram_bot.threaded = False
+    latencies = {}
+    started = time.perf_counter()
+    for label, payload in stream:
+        update = Update.de_json(payload)
+        t0 = time.perf_counter()
+        telegram_bot.process_new_updates([update])
+        latencies.setdefault(label, []).append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - started
+
+
+def run_stream_workers(stream, workers, telegram, nominatim):
+    """Dispatch the stream through the multi-process supervisor; returns (metrics, wall time)."""
+    from bot.supervisor import Supervisor
+    supervisor = Supervisor(workers, initializer=point_bot_at,
+                            initargs=(telegram.api_url, nominatim.url)).start()
+    started = time.perf_counter()
+    for _, payload in stream:
+        supervisor.dispatch(payload)
+    supervisor.shutdown(drain=True, timeout=600)
+    return supervisor.metrics(), time.perf_counter() - started
+
+
+def check_admin_replies(stream, telegram):
+    """Return problems if admin commands were not answered by the admin handlers."""
+    sent = [text for chat_id, text in telegram.messages if chat_id == ADMIN_TELEGRAM_ID]
+    problems = []
+    for label, marker in ADMIN_REPLIES.items():
+        expected = sum(1 for row_label, _ in stream if row_label == label)
+        answered = sum(1 for text in sent if marker in text)
+        if answered != expected:
+            problems.append(f"{label}: {answered} of {expected} updates got the admin reply")
+    return problems
+
+
+def run_stream_async(stream, api_url):
+    """Run each user's updates in order, all users concurrently, on the asyncio runtime."""
+    import asyncio
+    from telebot import asyncio_helper
+    from telebot.types import Update
+    from bot import async_runtime
+
+    # The async client keeps its own API_URL; point it at the same Telegram stub
+    asyncio_helper.API_URL = api_url
+    sessions = {}
+    for label, payload in stream:
+        sessions.setdefault(payload['message']['from']['id'], []).append((label, payload))
+    latencies = {}
+
+    async def run_session(updates):
+        for label, payload in updates:
+            t0 = time.perf_counter()
+            await async_runtime.abot.process_new_updates([Update.de_json(payload)])
+            latencies.setdefault(label, []).append(time.perf_counter() - t0)
+
+    async def run_all():
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(run_session(updates) for updates in sessions.values()))
+            return time.perf_counter() - started
+        finally:
+            await async_runtime.shutdown()
+
+    return latencies, asyncio.run(run_all())
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100.0 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+def summarize(latencies, wall_time):
+    results = {}
+    total = 0
+    for label, values in sorted(latencies.items()):
+        values = sorted(values)
+        busy = sum(values)
+        total += len(values)
+        results[label] = {
+            'count': len(values),
+            'throughput': len(values) / busy if busy else 0.0,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    results['all'] = {
+        'count': total,
+        'throughput': total / wall_time if wall_time else 0.0,
+        'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0,
+    }
+    merged = sorted(v for values in latencies.values() for v in values)
+    for pct in (50, 95, 99):
+        results['all'][f"p{pct}_ms"] = percentile(merged, pct) * 1000
+    return results
+
+
+def print_report(results, baseline=None):
+    header = f"{'command':<16}{'count':>8}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    if baseline:
+        header += f"{'Δ p95':>10}{'Δ ops/s':>10}"
+    print(header)
+    print('-' * len(header))
+    for label, row in results.items():
+        line = (f"{label:<16}{row['count']:>8}{row['throughput']:>12.1f}"
+                f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+        base = (baseline or {}).get(label)
+        if base:
+            line += f"{_change(row['p95_ms'], base['p95_ms']):>10}{_change(row['throughput'], base['throughput']):>10}"
+        print(line)
+
+
+def _change(current, previous):
+    if not previous:
+        return 'n/a'
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+def find_regressions(results, baseline, tolerance):
+    """Return human readable regressions of p95 latency or throughput beyond ``tolerance``."""
+    regressions = []
+    for label, base in baseline.items():
+        row = results.get(label)
+        if not row:
+            continue
+        if base['p95_ms'] and row['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {base['p95_ms']:.2f} ms -> {row['p95_ms']:.2f} ms")
+        if base['throughput'] and row['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {base['throughput']:.1f} -> {row['throughput']:.1f} ops/s")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    telegram = TelegramStub().start()
+    nominatim = NominatimStub(latency=args.geocode_latency).start()
+    try:
+        db_path = configure_environment(args, telegram, nominatim)
+        seed_database(args.users, args.contacts, rng)
+        stream = build_stream(args, rng)
+        print(f"Benchmark: {len(stream)} updates, {args.users} users, {args.contacts} contacts, "
+              f"geocode latency {args.geocode_latency * 1000:.0f} ms, database {db_path}")
+        if args.workers:
+            worker_metrics, wall_time = run_stream_workers(stream, args.workers, telegram, nominatim)
+        elif args.use_async:
+            latencies, wall_time = run_stream_async(stream, telegram.api_url)
+        else:
+            latencies, wall_time = run_stream(stream)
+    finally:
+        telegram.stop()
+        nominatim.stop()
+
+    problems = check_admin_replies(stream, telegram)
+    if problems:
+        print("Admin commands were not handled by bot/admin_commands.py:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+
+    if args.workers:
+        processed = sum(row.get('processed', 0) for row in worker_metrics)
+        for row in worker_metrics:
+            print(f"worker {row['worker']}: processed {row.get('processed', 0)}, "
+                  f"errors {row.get('errors', 0)}, busy {row.get('busy_seconds', 0.0):.2f}s")
+        print(f"{processed} updates in {wall_time:.2f}s with {args.workers} workers: "
+              f"{processed / wall_time:.1f} updates/s")
+        return 0
+
+    results = summarize(latencies, wall_time)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_report(results, baseline)
+    # ru_maxrss is in kilobytes on Linux
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+    document = {'params': vars(args), 'results': results, 'telegram_calls': telegram.calls}
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(document, f, indent=2, sort_keys=True)
+            print(f"Results written to {path}")
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance * 100:.0f}% tolerance:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
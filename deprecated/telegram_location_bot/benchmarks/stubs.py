@@ -0,0 +1,192 @@
+"""Local stand-ins for the Telegram Bot API and Nominatim used by the benchmarks."""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, parse_qsl
+
+
+def point_bot_at(api_url, nominatim_url):
+    """Point telebot and bot.location at the stubs (also the supervisor worker initializer)."""
+    from telebot import apihelper
+    apihelper.API_URL = api_url
+
+    from bot import location
+    location.GEOCODE_URL = nominatim_url + '/search'
+    location.REVERSE_URL = nominatim_url + '/reverse'
+
+
+class _StubServer:
+    """Run a ThreadingHTTPServer on a free localhost port in a daemon thread."""
+
+    handler_class = None
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class)
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self):
+        # Path looks like /bot<token>/<method>?<params>
+        parsed = urlparse(self.path)
+        method = parsed.path.rsplit('/', 1)[-1]
+        # telebot sends parameters in the query string, AsyncTeleBot as a form body
+        params = dict(parse_qsl(parsed.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+            if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                params.update(parse_qsl(body.decode('utf-8')))
+        try:
+            chat_id = int(params.get('chat_id', 0))
+        except ValueError:
+            chat_id = 0
+        stub = self.server.stub
+        with stub.lock:
+            stub.calls[method] = stub.calls.get(method, 0) + 1
+            stub.message_id += 1
+            message_id = stub.message_id
+            if method == 'sendMessage':
+                stub.messages.append((chat_id, params.get('text', '')))
+        result = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': '',
+        }
+        payload = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _reply
+    do_POST = _reply
+
+
+class TelegramStub(_StubServer):
+    """Accepts every Bot API method and answers with a minimal Message.
+
+    ``messages`` records the (chat id, text) of every sendMessage call.
+    """
+
+    handler_class = _TelegramHandler
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.messages = []
+        self.message_id = 0
+
+    @property
+    def api_url(self):
+        """Value for telebot.apihelper.API_URL."""
+        return self.url + "/bot{0}/{1}"
+
+
+class _NominatimHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        if stub.latency:
+            time.sleep(stub.latency)
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query).get('q', [''])[0]
+        if parsed.path.endswith('/search'):
+            lat, lon = stub.coordinates(query)
+            # Queries with digits are postcodes, anything else a town
+            kind = 'postcode' if any(c.isdigit() for c in query) else 'town'
+            data = [{'lat': str(lat), 'lon': str(lon), 'display_name': f"{query}, United Kingdom",
+                     'class': 'place', 'type': kind, 'addresstype': kind, 'name': query}]
+        else:
+            data = {'display_name': 'Somewhere, United Kingdom'}
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class NominatimStub(_StubServer):
+    """Deterministic geocoder with a tunable per-request latency (seconds)."""
+
+    handler_class = _NominatimHandler
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+
+    @staticmethod
+    def coordinates(query):
+        """Map a query to a stable point inside the UK bounding box."""
+        digest = hashlib.sha1(query.lower().encode('utf-8')).digest()
+        lat = 50.0 + (digest[0] * 256 + digest[1]) / 65535 * 8.5
+        lon = -5.5 + (digest[2] * 256 + digest[3]) / 65535 * 7.2
+        return round(lat, 6), round(lon, 6)
+
+
+class _AnalysisHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        with stub.lock:
+            stub.requests += 1
+            fail = stub.fail_next > 0
+            if fail:
+                stub.fail_next -= 1
+        if stub.latency:
+            time.sleep(stub.latency)
+        if fail:
+            self.send_response(stub.fail_status)
+            self.end_headers()
+            return
+        text = body.get('text', '')
+        sentiment = ('positive', 'neutral', 'negative')[len(text) % 3]
+        payload = json.dumps({'sentiment': sentiment, 'length': len(text)}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class AnalysisStub(_StubServer):
+    """Loveable.dev stand-in; ``fail_next`` makes the next N requests return ``fail_status``."""
+
+    handler_class = _AnalysisHandler
+
+    def __init__(self, latency=0.0, fail_next=0, fail_status=503):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.fail_next = fail_next
+        self.fail_status = fail_status
+        self.requests = 0
@@ -1,9 +1,33 @@
 """Bot package initializer. Sets up the Telegram bot instance."""
+import time
+_import_started = time.perf_counter()
+
 from . import config
 import telebot
 
 # Initialize the Telegram Bot
 bot = telebot.TeleBot(config.BOT_TOKEN, parse_mode='HTML')
 
-# Load handlers and admin commands to register them with the bot
-from . import handlers, admin_commands
+# Time spent importing the package (config, telebot), reported by bot.bootstrap
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+# Async client for the asyncio runtime (bot.async_runtime), created on first use
+_async_bot = None
+
+def get_async_bot():
+    """Return the AsyncTeleBot used by the asyncio runtime mode."""
+    global _async_bot
+    if _async_bot is None:
+        from telebot.async_telebot import AsyncTeleBot
+        _async_bot = AsyncTeleBot(config.BOT_TOKEN, parse_mode='HTML')
+    return _async_bot
+
+def load_handlers():
+    """Import admin commands and handlers to register them with the bot.
+
+    Deferred to the bootstrap phase (see bot.bootstrap) so that importing the
+    package does not pull in the handler modules and their dependencies.
+    Admin commands are registered first: telebot runs the first matching
+    handler, and bot.handlers ends with a catch-all text fallback.
+    """
+    from . import admin_commands, handlers  # noqa: F401
@@ -1,23 +1,21 @@
 # admin.py
 """Administrative utility functions for the bot (not Flask)."""
 from bot import config
-from admin.models import User, Location
+from admin.models import User
 
 def get_stats():
-    from bot.database import SessionLocal  # moved import inside function to avoid circular import
+    from bot import retention
+    from bot.database import ReadSessionLocal, pool_report  # moved import inside function to avoid circular import
     """Gather basic stats about the bot usage (user count, admin count, location count)."""
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         total_users = session.query(User).count()
         admin_users = session.query(User).filter(User.is_admin == True).count()
-        total_locations = session.query(Location).count()
+        # Hot search rows plus daily counts of archived search history
+        total_locations = retention.total_searches(session)
     finally:
         session.close()
     stats = (f"\U0001F465 Total users: {total_users} (Admins: {admin_users})\n" 
-             f"\U0001F4CD Locations logged: {total_locations}")
+             f"\U0001F4CD Locations logged: {total_locations}\n"
+             f"\U0001F5C4 Database pools:\n{pool_report()}")
     return stats
-
-# Deprecate backup_database function
-# This function is redundant with Supabase's automated backups and is no longer needed.
-# def backup_database():
-#     pass
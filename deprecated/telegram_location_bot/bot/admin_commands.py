@@ -4,12 +4,14 @@ from bot import bot
 from bot import admin as bot_admin
 from bot import database
 from bot import rbac
+from bot import auth_versions
+from bot import backup
 from bot.rate_limit import rate_limit
-from bot.auth import authenticate_user
 from admin.models import User
-from sqlalchemy import func
+from bot import user_directory
 from werkzeug.security import generate_password_hash
 import pyotp
+import os
 from bot.utils import format_user, safe_reply
 
 # Admin-only: /stats – show basic statistics
@@ -36,7 +38,7 @@ def promote_command(message):
         if identifier.isdigit():
             target_user = session.query(User).filter(User.telegram_id == int(identifier)).first()
         else:
-            target_user = session.query(User).filter(func.lower(User.username) == identifier.lower()).first()
+            target_user = user_directory.find_by_username(session, identifier)
         if not target_user:
             safe_reply(bot, message, f"❌ User not found: {identifier}")
             return
@@ -47,6 +49,7 @@ def promote_command(message):
         if not target_user.totp_secret:
             target_user.totp_secret = pyotp.random_base32()
         session.commit()
+        rbac.invalidate_admin_cache()
         if target_user.telegram_id:
             try:
                 bot.send_message(target_user.telegram_id, \
@@ -74,7 +77,7 @@ def demote_command(message):
         if identifier.isdigit():
             target_user = session.query(User).filter(User.telegram_id == int(identifier)).first()
         else:
-            target_user = session.query(User).filter(func.lower(User.username) == identifier.lower()).first()
+            target_user = user_directory.find_by_username(session, identifier)
         if not target_user:
             safe_reply(bot, message, f"❌ User not found: {identifier}")
             return
@@ -86,6 +89,8 @@ def demote_command(message):
             return
         target_user.is_admin = False
         session.commit()
+        rbac.invalidate_admin_cache()
+        auth_versions.bump_user(target_user.id)
         if target_user.telegram_id:
             try:
                 bot.send_message(target_user.telegram_id, "⚠️ Your admin access has been <b>revoked</b>.", parse_mode='HTML')
@@ -95,22 +100,43 @@ def demote_command(message):
     finally:
         session.close()
 
-# Admin-only: /backup – create a backup of the database and send it
+# Admin-only: /backup – create a backup of the database in the background and send its parts
 @bot.message_handler(commands=['backup'])
 @rbac.admin_required
 @rate_limit(limit_sec=30)
 def backup_command(message):
-    backup_path = bot_admin.backup_database()
-    if not backup_path:
-        safe_reply(bot, message, "❌ Backup failed. Please check server settings.")
-    else:
+    status = safe_reply(bot, message, "💾 Backup started...")
+    last_percent = [0]
+
+    def on_progress(done, total):
+        # Edit the status message at most every 10%
+        percent = done * 100 // max(total, 1)
+        if status is None or percent < last_percent[0] + 10:
+            return
+        last_percent[0] = percent
         try:
-            with open(backup_path, 'rb') as f:
-                bot.send_document(message.chat.id, f, caption=f"💾 Database backup created: {backup_path}")
+            bot.edit_message_text(f"💾 Backup in progress: {percent}%", message.chat.id, status.message_id)
         except Exception as e:
-            safe_reply(bot, message, "⚠️ Backup created, but I couldn't send the file (size might be too large).")
+            print(f"Failed to update backup progress: {e}")
+
+    def on_done(manifest_path):
+        directory = os.path.dirname(manifest_path)
+        manifest = backup.load_manifest(directory)
+        try:
+            for part in manifest['parts']:
+                with open(os.path.join(directory, part['name']), 'rb') as f:
+                    bot.send_document(message.chat.id, f, caption=f"💾 {part['name']} sha256 {part['sha256'][:16]}…")
+            with open(manifest_path, 'rb') as f:
+                bot.send_document(message.chat.id, f, caption=f"💾 Database backup created: {directory} ({len(manifest['parts'])} parts)")
+        except Exception as e:
+            safe_reply(bot, message, f"⚠️ Backup created in {directory}, but I couldn't send all parts.")
             print(f"Error sending backup file: {e}")
 
+    def on_error(error):
+        safe_reply(bot, message, "❌ Backup failed. Please check server settings.")
+
+    backup.start_backup(on_progress=on_progress, on_done=on_done, on_error=on_error)
+
 # Admin-only: /setpassword <user_id|username> <new_password> – set a user's password
 @bot.message_handler(commands=['setpassword'])
 @rbac.admin_required
@@ -133,7 +159,7 @@ def setpassword_command(message):
         if identifier.isdigit():
             target_user = session.query(User).filter(User.telegram_id == int(identifier)).first()
         else:
-            target_user = session.query(User).filter(func.lower(User.username) == identifier.lower()).first()
+            target_user = user_directory.find_by_username(session, identifier)
         if not target_user:
             safe_reply(bot, message, f"❌ User not found: {identifier}")
             return
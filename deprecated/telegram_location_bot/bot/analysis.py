@@ -0,0 +1,345 @@
+# analysis.py
+"""Background text-analysis pipeline for Loveable.dev.
+
+Handlers call ``enqueue()``, which never blocks on the network. Worker threads
+drain the queue in micro-batches, call the analysis API over a pooled session
+with timeouts and retry/backoff, and persist each batch with one bulk insert.
+Texts analyzed before are answered from an in-memory cache.
+
+The asyncio runtime (bot.async_runtime) uses the ``*_async`` counterparts:
+the same batching, retries, cache and counters, run as tasks on the event
+loop with async HTTP and database calls.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+import requests
+from bot import config, database, loveable
+
+_queue = queue.Queue(maxsize=config.ANALYSIS_QUEUE_SIZE)
+_workers = []
+_workers_lock = threading.Lock()
+_stopping = threading.Event()
+
+# Pipeline counters, reported by stats()
+_stats = {'enqueued': 0, 'dropped': 0, 'analyzed': 0, 'cache_hits': 0, 'failed': 0, 'saved': 0}
+_stats_lock = threading.Lock()
+
+
+class _ResultCache:
+    """Bounded LRU of analysis results keyed by a hash of the normalized text."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha1(" ".join(text.split()).lower().encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            result = self._data.get(key)
+            if result is not None:
+                self._data.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+_cache = _ResultCache(config.ANALYSIS_CACHE_SIZE)
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def is_enabled():
+    return bool(os.getenv("LOVEABLE_API_KEY"))
+
+
+def enqueue(user_id, text):
+    """Queue ``text`` for analysis. Returns False if it was dropped (disabled or queue full)."""
+    if not text or not is_enabled():
+        return False
+    _ensure_workers()
+    try:
+        _queue.put_nowait((user_id, text))
+    except queue.Full:
+        _count('dropped')
+        logging.warning("Analysis queue full, dropping text")
+        return False
+    _count('enqueued')
+    return True
+
+
+def _ensure_workers():
+    if _workers:
+        return
+    with _workers_lock:
+        if _workers:
+            return
+        _stopping.clear()
+        for i in range(config.ANALYSIS_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f"analysis-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def _next_batch():
+    """Block for the first item, then collect more until the batch is full or the wait expires."""
+    try:
+        batch = [_queue.get(timeout=0.5)]
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + config.ANALYSIS_BATCH_WAIT
+    while len(batch) < config.ANALYSIS_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _attempts():
+    # ANALYSIS_MAX_RETRIES is the total number of attempts; always make at least one
+    return max(1, config.ANALYSIS_MAX_RETRIES)
+
+
+def analyze_with_retry(text):
+    """Call the analysis API with exponential backoff on timeouts, 429 and 5xx responses."""
+    delay = 0.5
+    attempts = _attempts()
+    for attempt in range(1, attempts + 1):
+        try:
+            return loveable.request_analysis(text)
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and status < 500 and status != 429:
+                raise
+            if attempt == attempts:
+                raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == attempts:
+                raise
+        time.sleep(delay)
+        delay *= 2
+
+
+def _unique_texts(batch):
+    """Map cache key -> text for the distinct texts in ``batch``, in first-seen order."""
+    unique = {}
+    for _, text in batch:
+        unique.setdefault(_cache.key(text), text)
+    return unique
+
+
+def _batch_rows(batch, results):
+    """(user_id, text, result) rows for ``batch``, given results by cache key (None if failed)."""
+    rows = []
+    for user_id, text in batch:
+        result = results.get(_cache.key(text))
+        if result is not None:
+            rows.append((user_id, text, result))
+    # Repeats of a text within the batch are answered by its single analysis
+    _count('cache_hits', len(rows) - sum(1 for result in results.values() if result is not None))
+    return rows
+
+
+def _analyze(text, key):
+    """Cached analysis of one text; returns None (and counts a failure) if the API call fails."""
+    result = _cache.get(key)
+    if result is not None:
+        _count('cache_hits')
+        return result
+    try:
+        result = analyze_with_retry(text)
+    except Exception as e:
+        _count('failed')
+        logging.error(f"Text analysis failed: {e}")
+        return None
+    _cache.put(key, result)
+    _count('analyzed')
+    return result
+
+
+def process_batch(batch):
+    """Analyze a batch of (user_id, text) items and persist the results in one insert.
+
+    Each distinct text is analyzed once, however many times it appears in the batch.
+    """
+    unique = _unique_texts(batch)
+    results = {key: _analyze(text, key) for key, text in unique.items()}
+    rows = _batch_rows(batch, results)
+    if rows:
+        try:
+            _count('saved', database.save_analysis_results(rows))
+        except Exception as e:
+            logging.error(f"Failed to save {len(rows)} analysis results: {e}")
+    return len(rows)
+
+
+def _worker_loop():
+    while not _stopping.is_set():
+        batch = _next_batch()
+        if not batch:
+            continue
+        try:
+            process_batch(batch)
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def stop(drain=True, timeout=30):
+    """Stop the workers, by default after the queued texts have been processed."""
+    if drain:
+        deadline = time.monotonic() + timeout
+        while _queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+    _stopping.set()
+    with _workers_lock:
+        for worker in _workers:
+            worker.join(timeout=1)
+        _workers.clear()
+
+
+def stats():
+    """Return a snapshot of the pipeline counters plus the current queue depth."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot['queued'] = _queue.qsize() + (_async_queue.qsize() if _async_queue is not None else 0)
+    return snapshot
+
+
+# Asyncio pipeline, created on first use inside the running event loop
+_async_queue = None
+_async_workers = []
+
+
+def enqueue_async(user_id, text):
+    """Queue ``text`` on the event-loop pipeline. Returns False if it was dropped."""
+    if not text or not is_enabled():
+        return False
+    _ensure_async_workers()
+    try:
+        _async_queue.put_nowait((user_id, text))
+    except asyncio.QueueFull:
+        _count('dropped')
+        logging.warning("Analysis queue full, dropping text")
+        return False
+    _count('enqueued')
+    return True
+
+
+def _ensure_async_workers():
+    global _async_queue
+    if _async_workers:
+        return
+    _async_queue = asyncio.Queue(maxsize=config.ANALYSIS_QUEUE_SIZE)
+    for i in range(config.ANALYSIS_WORKERS):
+        _async_workers.append(asyncio.get_running_loop().create_task(
+            _async_worker_loop(), name=f"analysis-worker-{i}"
+        ))
+
+
+async def _next_batch_async():
+    batch = [await _async_queue.get()]
+    deadline = time.monotonic() + config.ANALYSIS_BATCH_WAIT
+    while len(batch) < config.ANALYSIS_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(_async_queue.get(), remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+async def analyze_with_retry_async(text):
+    """Async analyze_with_retry(): backoff on timeouts, connection errors, 429 and 5xx."""
+    import aiohttp
+    delay = 0.5
+    attempts = _attempts()
+    for attempt in range(1, attempts + 1):
+        try:
+            return await loveable.request_analysis_async(text)
+        except aiohttp.ClientResponseError as e:
+            if e.status < 500 and e.status != 429:
+                raise
+            if attempt == attempts:
+                raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == attempts:
+                raise
+        await asyncio.sleep(delay)
+        delay *= 2
+
+
+async def process_batch_async(batch):
+    """Async process_batch(): analyze the distinct texts concurrently, then persist in one insert."""
+    from bot import async_database
+
+    async def analyze(key, text):
+        result = _cache.get(key)
+        if result is not None:
+            _count('cache_hits')
+            return result
+        try:
+            result = await analyze_with_retry_async(text)
+        except Exception as e:
+            _count('failed')
+            logging.error(f"Text analysis failed: {e}")
+            return None
+        _cache.put(key, result)
+        _count('analyzed')
+        return result
+
+    unique = _unique_texts(batch)
+    analyzed = await asyncio.gather(*(analyze(key, text) for key, text in unique.items()))
+    rows = _batch_rows(batch, dict(zip(unique, analyzed)))
+    if rows:
+        try:
+            _count('saved', await async_database.save_analysis_results(rows))
+        except Exception as e:
+            logging.error(f"Failed to save {len(rows)} analysis results: {e}")
+    return len(rows)
+
+
+async def _async_worker_loop():
+    while True:
+        batch = await _next_batch_async()
+        try:
+            await process_batch_async(batch)
+        finally:
+            for _ in batch:
+                _async_queue.task_done()
+
+
+async def stop_async(drain=True, timeout=30):
+    """Stop the event-loop workers, by default after the queued texts have been processed."""
+    if drain and _async_queue is not None:
+        try:
+            await asyncio.wait_for(_async_queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Timed out draining the analysis queue")
+    for worker in _async_workers:
+        worker.cancel()
+    await asyncio.gather(*_async_workers, return_exceptions=True)
+    _async_workers.clear()
@@ -0,0 +1,141 @@
+# async_database.py
+"""Async SQLAlchemy engine and helpers for the asyncio runtime (bot.async_runtime).
+
+The async engine talks to the same database as bot.database, through an async
+driver: aiosqlite for SQLite, asyncpg for PostgreSQL. Helpers mirror the
+synchronous ones the handlers use, so a request never blocks the event loop
+waiting on the database.
+"""
+import datetime as dt
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from bot import config, contact_snapshot, database, user_directory
+from admin import models
+
+_engine = None
+_sessionmaker = None
+
+# Async drivers for the backends the bot supports
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+
+def async_url(url):
+    """Return ``url`` with its driver swapped for the async one (sqlite -> sqlite+aiosqlite)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=f"{backend}+{driver}")
+
+
+def get_async_engine():
+    """Return the async engine, creating it on first use (inside the running event loop)."""
+    global _engine
+    if _engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        url = async_url(config.DATABASE_URL)
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            _engine = create_async_engine(url, future=True)
+        else:
+            _engine = create_async_engine(
+                url,
+                future=True,
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_MAX_OVERFLOW,
+                pool_timeout=config.DB_POOL_TIMEOUT,
+                pool_recycle=config.DB_POOL_RECYCLE,
+                pool_pre_ping=config.DB_POOL_PRE_PING,
+            )
+    return _engine
+
+
+def AsyncSessionLocal():
+    """Create an AsyncSession; use as ``async with AsyncSessionLocal() as session``."""
+    global _sessionmaker
+    if _sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        # Keep attributes loaded after commit so detached users stay usable in handlers
+        _sessionmaker = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _sessionmaker()
+
+
+async def dispose():
+    """Close pooled connections (call before the event loop shuts down)."""
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _sessionmaker = None
+
+
+async def ensure_user(telegram_user):
+    """Get or create the user for a Telegram user, updating changed profile fields."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(models.User).where(models.User.telegram_id == telegram_user.id)
+        )
+        user = result.scalars().first()
+        created = user is None
+        if user:
+            updated = renamed = False
+            if telegram_user.username and user.username != telegram_user.username:
+                user.username = telegram_user.username
+                updated = renamed = True
+            if telegram_user.first_name and user.first_name != telegram_user.first_name:
+                user.first_name = telegram_user.first_name
+                updated = renamed = True
+            if telegram_user.last_name and user.last_name != telegram_user.last_name:
+                user.last_name = telegram_user.last_name
+                updated = True
+            if renamed:
+                # Contact snapshots show the username or first name
+                await session.run_sync(contact_snapshot.mark_changed)
+            if updated:
+                await session.commit()
+        else:
+            user = database.create_user(session, telegram_user)
+            await session.commit()
+        if user_directory.seen_due(user.id, force=created):
+            user_id, seen_at = user.id, dt.datetime.utcnow()
+            await session.run_sync(
+                lambda sync_session: user_directory.upsert_last_seen(sync_session.connection(), user_id, seen_at)
+            )
+            await session.commit()
+        return user
+
+
+async def record_search(user_id, query, latitude, longitude, address):
+    """Add a search history row (the /start quota; archived by bot.retention)."""
+    async with AsyncSessionLocal() as session:
+        session.add(models.Location(
+            user_id=user_id,
+            latitude=latitude,
+            longitude=longitude,
+            address=address,
+            query=query
+        ))
+        await session.commit()
+
+
+async def count_recent_searches(user_id, days=1):
+    """Number of location rows the user created in the last ``days`` days (the /start quota)."""
+    since = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=days)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(func.count(models.Location.id)).where(
+                models.Location.user_id == user_id,
+                models.Location.timestamp >= since
+            )
+        )
+        return result.scalar_one()
+
+
+async def save_analysis_results(rows):
+    """Async counterpart of database.save_analysis_results: one insert plus rollups."""
+    if not rows:
+        return 0
+    values = database.analysis_values(rows)
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(database.write_analysis_results, values)
+    return len(values)
@@ -0,0 +1,21 @@
+# async_http.py
+"""Shared aiohttp client session for async geocoding and analysis calls."""
+from bot import config
+
+_session = None
+
+
+def get_session():
+    """Return the shared ClientSession, creating it in the running event loop on first use."""
+    global _session
+    if _session is None or _session.closed:
+        import aiohttp
+        _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=config.ASYNC_HTTP_CONNECTIONS))
+    return _session
+
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
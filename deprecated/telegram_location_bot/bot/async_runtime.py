@@ -0,0 +1,244 @@
+# async_runtime.py
+"""Asyncio runtime mode for the bot.
+
+Handles the same commands as the threaded bot, but on one event loop:
+AsyncTeleBot for the Telegram API, the async SQLAlchemy engine from
+bot.async_database (aiosqlite locally), and aiohttp for geocoding and text
+analysis. A request waiting on the geocoder is a suspended coroutine rather
+than a blocked thread, so one process can hold thousands of slow lookups in
+flight.
+
+Nearest-contact lookups (an mmap scan) run in the default executor so they
+never stall the loop. Admin commands are rare and reuse the existing
+handlers from bot.admin_commands in a worker thread, behind the async admin
+check.
+
+Run with:
+    python -m bot.async_runtime
+or start app.py with BOT_ASYNC=1.
+"""
+import asyncio
+import logging
+import sys
+from bot import admin_commands, analysis, async_database, async_http, contact_snapshot
+from bot import config, get_async_bot, handlers, location, place_index, rbac
+from bot.handlers import PLACE_MARKER, USER_STATE
+from bot.rate_limit import async_rate_limit
+from bot.utils import async_safe_reply
+
+abot = get_async_bot()
+
+# Admin commands served by the threaded handlers in bot.admin_commands
+ADMIN_COMMANDS = {
+    'stats': admin_commands.stats_command,
+    'promote': admin_commands.promote_command,
+    'demote': admin_commands.demote_command,
+    'backup': admin_commands.backup_command,
+    'setpassword': admin_commands.setpassword_command,
+}
+
+
+async def geocode(message, query):
+    """Geocode ``query`` without blocking the loop; replies and returns None when nothing is found."""
+    geo_result = await location.geocode_address_async(query)
+    if not geo_result:
+        await async_safe_reply(abot, message, f"❌ Could not find any location for: {query}")
+        return None
+    place_index.index.learn_geocode(query, geo_result)
+    return geo_result
+
+
+async def record_search(user, query, lat, lon, address):
+    """Log a successful search as a history row, like handlers.record_search."""
+    try:
+        await async_database.record_search(user.id, query, lat, lon, address)
+    except Exception as e:
+        logging.error(f"Failed to record search: {e}")
+
+
+async def nearest(lat, lon, limit):
+    return await asyncio.to_thread(contact_snapshot.nearest_contacts, lat, lon, limit)
+
+
+async def reply_with_numbers(message, user, lat, lon, address):
+    try:
+        closest_results = await nearest(lat, lon, 5)
+        if not closest_results:
+            await async_safe_reply(abot, message, "No records found near that location.")
+            return
+        reply = handlers.render_numbers_reply(user, address, closest_results)
+        await async_safe_reply(abot, message, reply, parse_mode=None, disable_web_page_preview=True)
+    except Exception as e:
+        logging.error(f"Numbers lookup failed: {e}")
+        await async_safe_reply(abot, message, f"❌ An error occurred: {str(e)}")
+
+
+@abot.message_handler(commands=['start'])
+@async_rate_limit(limit_sec=2)
+async def start_command(message):
+    user = await async_database.ensure_user(message.from_user)
+    USER_STATE[user.id] = 'start'
+    if not user.is_active:
+        return
+    requests_left = max(0, 3 - await async_database.count_recent_searches(user.id))
+    welcome = handlers.get_welcome_message()
+    welcome += f"\n\n🎉 3 requests per 24hrs\n⚡ {requests_left} requests left for today"
+    await async_safe_reply(abot, message, welcome, parse_mode='HTML', disable_web_page_preview=True)
+
+
+@abot.message_handler(commands=['invite'])
+@async_rate_limit(limit_sec=2)
+async def invite_command(message):
+    user = await async_database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    await async_safe_reply(abot, message, "🔗 Here is your invite link: https://t.me/your_bot?start=invite")
+
+
+@abot.message_handler(commands=['number'])
+@async_rate_limit(limit_sec=2)
+async def number_command(message):
+    user = await async_database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    USER_STATE[user.id] = 'awaiting_location'
+    await async_safe_reply(abot, message, "📍 Please enter a location or postcode to search for numbers near you.")
+
+
+@abot.message_handler(commands=['numbers'])
+@async_rate_limit(limit_sec=2)
+async def numbers_command(message):
+    user = await async_database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    USER_STATE[user.id] = 'awaiting_location_numbers'
+    await async_safe_reply(abot, message, "📍 Please enter a location or postcode to search for multiple numbers near you.")
+
+
+@abot.message_handler(commands=list(ADMIN_COMMANDS))
+@rbac.async_admin_required
+async def admin_command(message):
+    command = message.text.split()[0].lstrip('/').split('@')[0].lower()
+    # The threaded handler keeps its own rate limit and replies through the sync client
+    await asyncio.to_thread(ADMIN_COMMANDS[command], message)
+
+
+@abot.inline_handler(func=lambda query: len(query.query.strip()) >= 2)
+async def inline_place_query(query):
+    results = await asyncio.to_thread(handlers.inline_place_results, query.query)
+    try:
+        await abot.answer_inline_query(query.id, results, cache_time=60)
+    except Exception as e:
+        logging.error(f"Failed to answer inline query: {e}")
+
+
+@abot.message_handler(func=lambda msg: msg.content_type == 'text' and msg.via_bot is not None
+                      and msg.text.startswith(PLACE_MARKER))
+@async_rate_limit(limit_sec=2)
+async def handle_inline_place(message):
+    user = await async_database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    name = message.text[len(PLACE_MARKER):].strip()
+    place = place_index.index.lookup(name)
+    if place is None:
+        geo_result = await geocode(message, name)
+        if not geo_result:
+            return
+        lat, lon, address = geo_result
+    else:
+        lat, lon, address = place.latitude, place.longitude, place.address
+    await record_search(user, name, lat, lon, address)
+    await reply_with_numbers(message, user, lat, lon, address)
+    USER_STATE[user.id] = 'start'
+
+
+@abot.message_handler(func=lambda msg: USER_STATE.get(msg.from_user.id) == 'awaiting_location' and msg.content_type == 'text')
+@async_rate_limit(limit_sec=2)
+async def handle_location_query(message):
+    user = await async_database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    query = message.text.strip()
+    geo_result = await geocode(message, query)
+    if not geo_result:
+        return
+    lat, lon, address = geo_result
+    await record_search(user, query, lat, lon, address)
+    try:
+        closest_results = await nearest(lat, lon, 1)
+        if not closest_results:
+            await async_safe_reply(abot, message, "No records found near that location.")
+            return
+        contact_name, phone_number, _ = closest_results[0]
+        reply = handlers.render_number_reply(user, address, contact_name, phone_number)
+        await async_safe_reply(abot, message, reply, parse_mode='HTML', disable_web_page_preview=True)
+    except Exception as e:
+        logging.error(f"Number lookup failed: {e}")
+        await async_safe_reply(abot, message, f"❌ An error occurred: {str(e)}")
+    USER_STATE[user.id] = 'start'
+
+
+@abot.message_handler(func=lambda msg: USER_STATE.get(msg.from_user.id) == 'awaiting_location_numbers' and msg.content_type == 'text')
+@async_rate_limit(limit_sec=2)
+async def handle_numbers_query(message):
+    user = await async_database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    query = message.text.strip()
+    geo_result = await geocode(message, query)
+    if not geo_result:
+        return
+    lat, lon, address = geo_result
+    await record_search(user, query, lat, lon, address)
+    await reply_with_numbers(message, user, lat, lon, address)
+    USER_STATE[user.id] = 'start'
+
+
+@abot.message_handler(func=lambda msg: msg.content_type == 'text' and USER_STATE.get(msg.from_user.id, 'start') == 'start')
+@async_rate_limit(limit_sec=1)
+async def fallback(message):
+    user = await async_database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    if config.ANALYZE_USER_MESSAGES and message.text and not message.text.startswith('/'):
+        analysis.enqueue_async(user.id, message.text)
+    await async_safe_reply(abot, message, "❓ Please use /number to search for a number, or /invite to invite a friend.")
+
+
+async def shutdown():
+    """Drain the analysis pipeline and close HTTP sessions and pooled connections."""
+    await analysis.stop_async(drain=True)
+    await async_http.close()
+    await async_database.dispose()
+    try:
+        await abot.close_session()
+    except Exception:
+        pass
+
+
+async def serve(timeout=60):
+    """Poll Telegram on the running loop until cancelled."""
+    try:
+        await abot.infinity_polling(timeout=timeout)
+    finally:
+        await shutdown()
+
+
+def run():
+    """Bootstrap (schema, admin user, threaded admin handlers) and run the event loop."""
+    from bot.bootstrap import bootstrap
+    bootstrap()
+    asyncio.run(serve())
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    from bot import retention
+    retention.start_worker()
+    run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,34 +6,52 @@ from werkzeug.security import check_password_hash
 import pyotp
 from admin.models import User
 
-# Deprecate authenticate_user and verify_totp functions
-# These functions are redundant with Supabase authentication and 2FA mechanisms.
-# def authenticate_user(username, password):
-#     pass
+def authenticate_user(username, password):
+    """Return the active admin with these credentials, or None."""
+    from bot.database import SessionLocal
+    session_db = SessionLocal()
+    try:
+        user = session_db.query(User).filter(
+            User.username == username, User.is_admin == True, User.is_active == True
+        ).first()
+    finally:
+        session_db.close()
+    if user is None or not user.password_hash or not check_password_hash(user.password_hash, password):
+        return None
+    return user
 
-# def verify_totp(user, code):
-#     pass
+def verify_totp(user, code):
+    """Check a 2FA code against the user's TOTP secret (one step of clock drift allowed)."""
+    if not user.totp_secret:
+        return False
+    return pyotp.TOTP(user.totp_secret).verify(code, valid_window=1)
+
+def start_admin_session(user):
+    """Mark ``user`` as logged in, embedding their current authorization version."""
+    from bot.auth_versions import user_version
+    session['user_id'] = user.id
+    session['auth_version'] = user_version(user.id)
 
 def login_required(func):
-    """Flask route decorator to require admin login (including 2FA)."""
+    """Flask route decorator to require admin login (including 2FA).
+
+    The signed session carries the user's authorization version from login time.
+    It is compared against the in-memory version map (see bot.auth_versions), so
+    a demotion or deactivation takes effect within seconds without a database
+    query on every page load.
+    """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        from bot.database import SessionLocal  # moved import inside function to avoid circular import
+        from bot.auth_versions import user_version
         user_id = session.get('user_id')
         if not user_id:
             # Not logged in
             return redirect(url_for('admin_bp.login'))
-        # Optionally verify user still exists and is admin
-        session_db = SessionLocal()
-        try:
-            user = session_db.query(User).get(user_id)
-            if not user or not user.is_admin or not user.is_active:
-                # User no longer authorized (could have been removed or demoted)
-                session.clear()
-                flash("Your account is no longer authorized. Please log in again.", "warning")
-                return redirect(url_for('admin_bp.login'))
-        finally:
-            session_db.close()
+        if session.get('auth_version') != user_version(user_id):
+            # User no longer authorized (could have been removed, demoted or deactivated)
+            session.clear()
+            flash("Your account is no longer authorized. Please log in again.", "warning")
+            return redirect(url_for('admin_bp.login'))
         # User is logged in and still authorized
         return func(*args, **kwargs)
     return wrapper
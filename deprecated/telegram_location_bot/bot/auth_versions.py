@@ -0,0 +1,122 @@
+# auth_versions.py
+"""Shared authorization version counters (auth_versions table).
+
+Rows are named ``admins`` for admin membership and ``user:<id>`` for a single
+user's authorization. Bumping a counter tells every process that cached
+authorization data for it is stale. Every per-user bump also bumps the
+``users`` counter, so processes poll that one row and only reload the
+per-user counters when it moves.
+"""
+import logging
+import threading
+import time
+from sqlalchemy import update
+from bot import config
+from admin.models import AuthVersion
+
+USER_PREFIX = 'user:'
+# Bumped together with any user:<id> row
+USERS_KEY = 'users'
+
+# user id -> authorization version, refreshed by a background thread
+_user_versions = {}
+# USERS_KEY version that _user_versions was loaded at
+_users_version = None
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def bump(session, name):
+    """Increment the named counter inside ``session`` (caller commits)."""
+    result = session.execute(
+        update(AuthVersion)
+        .where(AuthVersion.name == name)
+        .values(version=AuthVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        session.add(AuthVersion(name=name, version=1))
+
+def bump_user(user_id):
+    """Invalidate a user's admin panel sessions (demotion, deactivation)."""
+    from bot.database import SessionLocal
+    session = SessionLocal()
+    try:
+        bump(session, f"{USER_PREFIX}{user_id}")
+        bump(session, USERS_KEY)
+        session.commit()
+        version = session.get(AuthVersion, f"{USER_PREFIX}{user_id}").version
+    finally:
+        session.close()
+    # Apply locally right away; other processes see it on their next refresh
+    _user_versions[user_id] = version
+    return version
+
+def bump_users(user_ids):
+    """bump_user() for many users in one transaction (bulk deactivation or demotion)."""
+    from bot.database import SessionLocal
+    names = [f"{USER_PREFIX}{user_id}" for user_id in user_ids]
+    if not names:
+        return
+    session = SessionLocal()
+    try:
+        for name in names:
+            bump(session, name)
+        bump(session, USERS_KEY)
+        session.commit()
+        rows = session.query(AuthVersion.name, AuthVersion.version).filter(AuthVersion.name.in_(names)).all()
+    finally:
+        session.close()
+    for name, version in rows:
+        _user_versions[int(name[len(USER_PREFIX):])] = version
+
+def _read_users_version(session):
+    row = session.get(AuthVersion, USERS_KEY)
+    return row.version if row else 0
+
+def load_user_versions(known_version=None):
+    """Read all per-user counters, unless the ``users`` counter still equals ``known_version``.
+
+    Returns (users version, {user id: version}), with None for the map when nothing changed.
+    """
+    from bot.database import SessionLocal
+    session = SessionLocal()
+    try:
+        users_version = _read_users_version(session)
+        if users_version == known_version:
+            return users_version, None
+        rows = session.query(AuthVersion.name, AuthVersion.version).filter(
+            AuthVersion.name.like(f"{USER_PREFIX}%")
+        ).all()
+    finally:
+        session.close()
+    return users_version, {int(name[len(USER_PREFIX):]): version for name, version in rows}
+
+def _reload():
+    global _user_versions, _users_version
+    users_version, versions = load_user_versions(_users_version)
+    if versions is not None:
+        _user_versions = versions
+        _users_version = users_version
+
+def _refresh_loop():
+    while True:
+        time.sleep(config.AUTH_VERSION_REFRESH)
+        try:
+            _reload()
+        except Exception as e:
+            logging.warning(f"Failed to refresh authorization versions: {e}")
+
+def _ensure_refresher():
+    global _refresher
+    if _refresher is not None:
+        return
+    with _refresher_lock:
+        if _refresher is not None:
+            return
+        _reload()
+        _refresher = threading.Thread(target=_refresh_loop, name='auth-version-refresh', daemon=True)
+        _refresher.start()
+
+def user_version(user_id):
+    """Return the current authorization version for ``user_id`` without a database query."""
+    _ensure_refresher()
+    return _user_versions.get(user_id, 0)
@@ -0,0 +1,391 @@
+# backup.py
+"""Streaming, chunked, compressed database backups.
+
+A backup is a consistent online snapshot, streamed through gzip in fixed-size
+chunks and split into parts below Telegram's upload limit. Each backup
+directory holds the parts plus a ``manifest.json`` with per-part SHA-256
+checksums.
+
+- SQLite: the sqlite3 online backup API copies the database to a temporary
+  file, which is then streamed (the live database is never locked for long).
+- PostgreSQL: every table in the current schema (including the Supabase-owned
+  users and locations tables) is dumped with ``COPY ... TO STDOUT`` inside one
+  REPEATABLE READ, read-only transaction, parents before the tables that
+  reference them, framed so restore can ``COPY ... FROM STDIN``.
+
+Command line:
+    python -m bot.backup create
+    python -m bot.backup restore backups/20240101-120000 [--target restored.db]
+"""
+import argparse
+import datetime as dt
+import graphlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+from sqlalchemy.engine import make_url
+from bot import config
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_SQLITE = 'sqlite-file'
+FORMAT_PG_COPY = 'pg-copy-frames'
+
+# Frame markers for the PostgreSQL COPY stream: table start, data, table end
+_TABLE, _DATA, _END = b'T', b'D', b'E'
+
+
+class BackupError(Exception):
+    """Raised when a backup cannot be created or verified."""
+
+
+class _PartWriter:
+    """Gzip-compresses written bytes and rolls them into numbered part files."""
+
+    def __init__(self, directory, part_size):
+        self.directory = directory
+        self.part_size = part_size
+        self.parts = []
+        self.raw_bytes = 0
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+        self._file = None
+        self._hash = None
+        self._size = 0
+
+    def _open_part(self):
+        name = f"part{len(self.parts) + 1:04d}.gz"
+        self._file = open(os.path.join(self.directory, name), 'wb')
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self.parts.append({'name': name})
+
+    def _close_part(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self.parts[-1].update(size=self._size, sha256=self._hash.hexdigest())
+        self._file = None
+
+    def _emit(self, data):
+        while data:
+            if self._file is None:
+                self._open_part()
+            room = self.part_size - self._size
+            piece, data = data[:room], data[room:]
+            self._file.write(piece)
+            self._hash.update(piece)
+            self._size += len(piece)
+            if self._size >= self.part_size:
+                self._close_part()
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.raw_bytes += len(data)
+        self._emit(self._compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        self._emit(self._compressor.flush())
+        self._close_part()
+
+
+def _sqlite_path(url):
+    database = url.database
+    if not database or database == ':memory:':
+        raise BackupError("In-memory SQLite databases cannot be backed up")
+    return database
+
+
+def _snapshot_sqlite(url, writer, progress, chunk_size):
+    """Take an online snapshot with the sqlite3 backup API and stream it into ``writer``."""
+    fd, snapshot_path = tempfile.mkstemp(suffix='.db', prefix='backup-')
+    os.close(fd)
+    try:
+        source = sqlite3.connect(_sqlite_path(url))
+        target = sqlite3.connect(snapshot_path)
+        try:
+            # Copy in steps so concurrent writers are not blocked for the whole copy
+            source.backup(target, pages=1024)
+        finally:
+            target.close()
+            source.close()
+        total = os.path.getsize(snapshot_path)
+        done = 0
+        with open(snapshot_path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                done += len(chunk)
+                progress(done, total)
+    finally:
+        os.remove(snapshot_path)
+
+
+class _FrameWriter:
+    """File-like target for copy_expert that wraps each write in a data frame."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.writer.write(_DATA + struct.pack('>I', len(data)) + data)
+        return len(data)
+
+
+# Plain tables (and partitions) of the current schema; partitioned parents have no rows of their own
+_PG_TABLES_SQL = """
+SELECT c.relname FROM pg_class c
+WHERE c.relnamespace = current_schema()::regnamespace AND c.relkind = 'r'
+"""
+# Foreign keys between those tables: (referencing table, referenced table)
+_PG_FOREIGN_KEYS_SQL = """
+SELECT c.relname, p.relname FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_class p ON p.oid = con.confrelid
+WHERE con.contype = 'f' AND c.relnamespace = current_schema()::regnamespace
+"""
+
+
+def _postgres_tables(cursor):
+    """Tables to dump, referenced tables first so restore satisfies foreign keys."""
+    cursor.execute(_PG_TABLES_SQL)
+    names = sorted(row[0] for row in cursor.fetchall())
+    cursor.execute(_PG_FOREIGN_KEYS_SQL)
+    sorter = graphlib.TopologicalSorter({name: set() for name in names})
+    for table, referenced in cursor.fetchall():
+        if table != referenced and referenced in names:
+            sorter.add(table, referenced)
+    try:
+        return list(sorter.static_order())
+    except graphlib.CycleError:
+        logging.warning("Foreign key cycle between tables; dumping in name order")
+        return names
+
+
+def _snapshot_postgres(engine, writer, progress):
+    """Dump every table in the schema with COPY inside one consistent read-only transaction."""
+    raw = engine.raw_connection()
+    try:
+        # psycopg2 opens the transaction on the first execute, so set its snapshot mode first
+        raw.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        cursor = raw.cursor()
+        tables = _postgres_tables(cursor)
+        for index, name in enumerate(tables, 1):
+            encoded = name.encode('utf-8')
+            writer.write(_TABLE + struct.pack('>I', len(encoded)) + encoded)
+            cursor.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT binary)', _FrameWriter(writer))
+            writer.write(_END)
+            progress(index, len(tables))
+        raw.commit()
+    finally:
+        # Don't hand a read-only session back to the pool
+        raw.detach()
+        raw.close()
+
+
+def create_backup(progress=None, directory=None, part_size=None, chunk_size=None):
+    """Create a backup and return the path of its manifest.
+
+    ``progress(done, total)`` is called as the snapshot is streamed (bytes for
+    SQLite, tables for PostgreSQL).
+    """
+    from bot.database import get_engine
+    progress = progress or (lambda done, total: None)
+    part_size = part_size or config.BACKUP_PART_SIZE
+    chunk_size = chunk_size or config.BACKUP_CHUNK_SIZE
+    started = dt.datetime.utcnow()
+    directory = directory or os.path.join(config.BACKUP_DIR, started.strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(directory, exist_ok=True)
+
+    url = make_url(config.DATABASE_URL)
+    writer = _PartWriter(directory, part_size)
+    if url.get_backend_name() == 'sqlite':
+        backup_format = FORMAT_SQLITE
+        _snapshot_sqlite(url, writer, progress, chunk_size)
+    elif url.get_backend_name() == 'postgresql':
+        backup_format = FORMAT_PG_COPY
+        _snapshot_postgres(get_engine(), writer, progress)
+    else:
+        raise BackupError(f"Backups are not supported for {url.get_backend_name()}")
+    writer.close()
+
+    manifest = {
+        'created_at': started.isoformat() + 'Z',
+        'format': backup_format,
+        'compression': 'gzip',
+        'raw_bytes': writer.raw_bytes,
+        'part_size': part_size,
+        'parts': writer.parts,
+    }
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logging.info(f"Backup written to {directory} ({len(writer.parts)} parts, {writer.raw_bytes} raw bytes)")
+    return manifest_path
+
+
+def start_backup(on_progress=None, on_done=None, on_error=None):
+    """Run create_backup() in a background thread and report through callbacks."""
+    def run():
+        try:
+            manifest_path = create_backup(progress=on_progress)
+        except Exception as e:
+            logging.error(f"Backup failed: {e}")
+            if on_error:
+                on_error(e)
+            return
+        if on_done:
+            on_done(manifest_path)
+    thread = threading.Thread(target=run, name='backup', daemon=True)
+    thread.start()
+    return thread
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def verify_backup(directory):
+    """Check every part against the manifest checksums; raises BackupError on mismatch."""
+    manifest = load_manifest(directory)
+    for part in manifest['parts']:
+        digest = hashlib.sha256()
+        with open(os.path.join(directory, part['name']), 'rb') as f:
+            for chunk in iter(lambda: f.read(config.BACKUP_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != part['sha256']:
+            raise BackupError(f"Checksum mismatch for {part['name']}")
+    return manifest
+
+
+def _iter_decompressed(directory, manifest):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for part in manifest['parts']:
+        with open(os.path.join(directory, part['name']), 'rb') as f:
+            for chunk in iter(lambda: f.read(config.BACKUP_CHUNK_SIZE), b''):
+                data = decompressor.decompress(chunk)
+                if data:
+                    yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+class _StreamReader:
+    """Buffered exact-size reads over the decompressed chunk iterator."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = bytearray()
+
+    def read_exact(self, size):
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                raise BackupError("Backup stream ended unexpectedly")
+            self._buffer.extend(chunk)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def at_end(self):
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return True
+            self._buffer.extend(chunk)
+        return False
+
+
+class _TableReader:
+    """File-like source for copy_expert that yields one table's data frames."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.done = False
+
+    def read(self, size=-1):
+        if self.done:
+            return b''
+        marker = self.stream.read_exact(1)
+        if marker == _END:
+            self.done = True
+            return b''
+        if marker != _DATA:
+            raise BackupError("Corrupt backup stream")
+        length, = struct.unpack('>I', self.stream.read_exact(4))
+        return self.stream.read_exact(length)
+
+    readline = read
+
+
+def restore_backup(directory, target=None):
+    """Verify and restore a backup.
+
+    SQLite backups are written to ``target`` (a file path, default: the configured
+    database file, which should not be in use). PostgreSQL backups are loaded
+    into the configured database with COPY FROM STDIN; tables must be empty.
+    """
+    manifest = verify_backup(directory)
+    chunks = _iter_decompressed(directory, manifest)
+    if manifest['format'] == FORMAT_SQLITE:
+        target = target or _sqlite_path(make_url(config.DATABASE_URL))
+        tmp_path = f"{target}.restore"
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, target)
+        return target
+    if manifest['format'] == FORMAT_PG_COPY:
+        from bot.database import get_engine
+        stream = _StreamReader(chunks)
+        raw = get_engine().raw_connection()
+        try:
+            cursor = raw.cursor()
+            while not stream.at_end():
+                if stream.read_exact(1) != _TABLE:
+                    raise BackupError("Corrupt backup stream")
+                length, = struct.unpack('>I', stream.read_exact(4))
+                name = stream.read_exact(length).decode('utf-8')
+                reader = _TableReader(stream)
+                cursor.copy_expert(f'COPY "{name}" FROM STDIN WITH (FORMAT binary)', reader)
+                while not reader.done:
+                    reader.read()
+            raw.commit()
+        finally:
+            raw.close()
+        return config.DATABASE_URL
+    raise BackupError(f"Unknown backup format: {manifest['format']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or restore database backups.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('create', help="create a backup")
+    restore = sub.add_parser('restore', help="restore a backup directory")
+    restore.add_argument('directory')
+    restore.add_argument('--target', help="SQLite file to restore into (default: the configured database)")
+    args = parser.parse_args(argv)
+    if args.command == 'create':
+        def report(done, total):
+            print(f"\r{done * 100 // max(total, 1)}%", end='', flush=True)
+        print(f"\nManifest: {create_backup(progress=report)}")
+    else:
+        print(f"Restored into {restore_backup(args.directory, args.target)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# bootstrap.py
+"""Explicit application bootstrap with per-phase startup timing.
+
+Importing the bot package has no side effects beyond reading configuration.
+Processes call ``bootstrap()`` once to register handlers and, unless disabled
+(``BOOTSTRAP_SCHEMA=0`` / ``BOOTSTRAP_ADMIN=0`` for worker processes), create
+the schema and the initial admin user.
+
+Print a startup timing report, and fail if cold start exceeds a budget:
+    python -m bot.bootstrap --budget 2.0
+tests/test_startup.py checks the same budget for a worker-style bootstrap.
+"""
+import argparse
+import sys
+import time
+from contextlib import contextmanager
+
+# (phase, seconds) in the order the phases ran
+STARTUP_TIMINGS = []
+# Phases already run in this process (a forked worker may still need to load handlers)
+_done = set()
+
+@contextmanager
+def timed_phase(name):
+    """Record how long the wrapped block takes under ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS.append((name, time.perf_counter() - start))
+
+def bootstrap(create_schema=None, init_admin=None, load_handlers=True):
+    """Run each startup phase at most once; arguments override the config defaults."""
+    from bot import config, IMPORT_SECONDS, load_handlers as _load_handlers
+    if 'import' not in _done:
+        STARTUP_TIMINGS.append(('import bot', IMPORT_SECONDS))
+        with timed_phase('import database'):
+            from bot import database  # noqa: F401
+        _done.add('import')
+    from bot import database
+    if create_schema is None:
+        create_schema = config.BOOTSTRAP_SCHEMA
+    if init_admin is None:
+        init_admin = config.BOOTSTRAP_ADMIN
+    if create_schema and 'schema' not in _done:
+        with timed_phase('create schema'):
+            database.create_schema()
+        _done.add('schema')
+    if config.DATABASE_REPLICA_URL and 'replica' not in _done:
+        with timed_phase('check replica'):
+            database.check_replica()
+        _done.add('replica')
+    if init_admin and 'admin' not in _done:
+        with timed_phase('init admin user'):
+            database.init_admin_user()
+        _done.add('admin')
+    if load_handlers and 'handlers' not in _done:
+        with timed_phase('load handlers'):
+            _load_handlers()
+        _done.add('handlers')
+    return STARTUP_TIMINGS
+
+def format_startup_report(timings=None):
+    """Return an ``-X importtime``-style table of startup phases."""
+    timings = STARTUP_TIMINGS if timings is None else timings
+    lines = [f"{'phase':<20}|{'self [ms]':>11}|{'cumulative [ms]':>17}"]
+    cumulative = 0.0
+    for name, seconds in timings:
+        cumulative += seconds
+        lines.append(f"{name:<20}|{seconds * 1000:>11.1f}|{cumulative * 1000:>17.1f}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bootstrap the bot and report startup timings.")
+    parser.add_argument('--budget', type=float, help="fail if total startup time exceeds this many seconds")
+    parser.add_argument('--no-schema', action='store_true', help="skip schema creation")
+    parser.add_argument('--no-admin', action='store_true', help="skip the initial admin user check")
+    args = parser.parse_args(argv)
+    timings = bootstrap(
+        create_schema=False if args.no_schema else None,
+        init_admin=False if args.no_admin else None,
+    )
+    total = sum(seconds for _, seconds in timings)
+    print(format_startup_report())
+    print(f"Total startup: {total * 1000:.1f} ms")
+    if args.budget is not None and total > args.budget:
+        print(f"Startup exceeded budget of {args.budget * 1000:.0f} ms")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
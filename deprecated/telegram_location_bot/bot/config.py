@@ -13,22 +13,90 @@ if not BOT_TOKEN:
 # Flask secret key for sessions (use a secure random value in production)
 SECRET_KEY = os.getenv("SECRET_KEY", "dev_secret_key")
 
+# Seconds between mtime checks of the reply template files (see bot.template_registry)
+TEMPLATE_CHECK_INTERVAL = float(os.getenv("TEMPLATE_CHECK_INTERVAL", "5"))
+
 # Database URL (required)
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set in environment or .env file.")
 
+# Optional read replica for read-only paths (stats, admin listings, nearest search).
+# Falls back to the primary when unset. The replica must be a copy or follower of the
+# primary: tables are only created on the primary, and bootstrap fails if the replica
+# is missing any. For local testing, copy the primary SQLite file after creating the schema.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Connection pool settings (ignored for in-memory SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+# Log a warning when waiting for a pooled connection takes longer than this (seconds)
+DB_POOL_SLOW_WAIT = float(os.getenv("DB_POOL_SLOW_WAIT", "0.5"))
+
+# Admin role cache: full refresh interval, and how often the shared version counter is checked (seconds)
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "300"))
+ADMIN_CACHE_VERSION_CHECK = float(os.getenv("ADMIN_CACHE_VERSION_CHECK", "5"))
+
+# How often the per-user authorization versions for admin panel sessions are reloaded (seconds)
+AUTH_VERSION_REFRESH = float(os.getenv("AUTH_VERSION_REFRESH", "2"))
+
+# Loveable.dev text analysis pipeline (see bot.analysis)
+# Off by default: when on, users' free-text messages are sent to the third-party API
+ANALYZE_USER_MESSAGES = os.getenv("ANALYZE_USER_MESSAGES") == "1"
+LOVEABLE_API_URL = os.getenv("LOVEABLE_API_URL", "https://api.loveable.dev/analyze")
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "20"))
+ANALYSIS_BATCH_WAIT = float(os.getenv("ANALYSIS_BATCH_WAIT", "0.5"))
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", "5"))
+ANALYSIS_MAX_RETRIES = int(os.getenv("ANALYSIS_MAX_RETRIES", "3"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "1000"))
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+
+# Number of bot worker processes; above 1 the bot runs under bot.supervisor
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+
+# Run the bot on the asyncio runtime (bot.async_runtime) instead of threaded polling
+BOT_ASYNC = os.getenv("BOT_ASYNC") == "1"
+# Outbound HTTP connections (geocoding, analysis) shared by all handlers in async mode
+ASYNC_HTTP_CONNECTIONS = int(os.getenv("ASYNC_HTTP_CONNECTIONS", "100"))
+
+# Disable the per-user command throttle (load testing only)
+RATE_LIMIT_DISABLED = os.getenv("RATE_LIMIT_DISABLED") == "1"
+
+# Database backups (/backup): output directory, part size kept under Telegram's 50 MB upload limit
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_PART_SIZE = int(os.getenv("BACKUP_PART_SIZE", str(45 * 1024 * 1024)))
+BACKUP_CHUNK_SIZE = int(os.getenv("BACKUP_CHUNK_SIZE", str(1024 * 1024)))
+
+# Location search history retention: rows older than RETENTION_DAYS move to gzip archives
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+# Memory-mapped contact snapshot for nearest-contact lookups (see bot.contact_snapshot)
+CONTACT_SNAPSHOT_PATH = os.getenv("CONTACT_SNAPSHOT_PATH", os.path.join("cache", "contacts.snap"))
+CONTACT_SNAPSHOT_CHECK = float(os.getenv("CONTACT_SNAPSHOT_CHECK", "10"))
+
+# Inline place autocomplete (see bot.place_index): known places and the "contacts nearby" radius
+PLACES_FILE = os.getenv("PLACES_FILE", os.path.join("cache", "places.csv"))
+PLACE_CONTACT_RADIUS_KM = float(os.getenv("PLACE_CONTACT_RADIUS_KM", "10"))
+INLINE_MAX_RESULTS = int(os.getenv("INLINE_MAX_RESULTS", "10"))
+
+# Admin user directory (see bot.user_directory): last-seen write throttle (seconds), page and batch sizes
+USER_SEEN_INTERVAL = float(os.getenv("USER_SEEN_INTERVAL", "300"))
+USER_PAGE_SIZE = int(os.getenv("USER_PAGE_SIZE", "50"))
+USER_BULK_BATCH_SIZE = int(os.getenv("USER_BULK_BATCH_SIZE", "500"))
+
 # Initial admin credentials (for creating the first admin user)
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "adminpass")
 ADMIN_TOTP_SECRET = os.getenv("ADMIN_TOTP_SECRET")
+# If no TOTP secret is provided, one is generated when the initial admin is created
 
-# If no TOTP secret provided, generate one (print it out for setup)
-if not ADMIN_TOTP_SECRET:
-    try:
-        import pyotp
-        ADMIN_TOTP_SECRET = pyotp.random_base32()
-        print(f"Generated TOTP secret for admin (save this for 2FA setup): {ADMIN_TOTP_SECRET}")
-    except ImportError:
-        # If pyotp not installed yet at import time, skip generation
-        ADMIN_TOTP_SECRET = None
+# Startup bootstrap: worker processes can skip schema creation and admin bootstrap
+BOOTSTRAP_SCHEMA = os.getenv("BOOTSTRAP_SCHEMA", "1") != "0"
+BOOTSTRAP_ADMIN = os.getenv("BOOTSTRAP_ADMIN", "1") != "0"
@@ -0,0 +1,298 @@
+# contact_snapshot.py
+"""Memory-mapped contact snapshot for nearest-contact lookups.
+
+The contacts the nearest search reads (location rows joined with their user)
+are written to a compact, versioned binary file: fixed-width arrays of ids,
+coordinates and string-table indexes, followed by an interned UTF-8 string
+table for names and phone numbers. Every process maps the file read-only, so
+the pages are shared through the OS page cache and a restart or new worker
+only pays for an mmap, not a database scan.
+
+The file header records the database version it was built from: the
+``contacts`` counter in data_versions, bumped by writers through
+``mark_changed()``, plus the contact row count and highest id, which catch
+rows added or removed by other tools. Contacts are location rows without a
+``query``; rows with one are search history (see bot.retention) and never
+affect the snapshot.
+
+Lookups never wait for a rebuild. A background thread maps the snapshot at
+startup (``warm()``) and, at most every CONTACT_SNAPSHOT_CHECK seconds,
+compares the file's version with the database, rebuilding it (atomically, via
+a temporary file and os.replace) when it is stale. Lookups keep using the
+current map until the new one is ready.
+
+Layout (little endian):
+    header   8s magic, I format, I count, Q counter, Q row_count, Q max_id, Q string_count
+    int64    ids[count]
+    float64  latitudes[count], longitudes[count]
+    uint32   name_index[count], phone_index[count]
+    uint32   string_offsets[string_count + 1]
+    bytes    string blob
+"""
+import heapq
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from sqlalchemy import func
+from bot import config
+from bot.rollups import upsert_add
+from admin.models import DataVersion, Location, User
+
+MAGIC = b'CONTSNAP'
+FORMAT_VERSION = 1
+VERSION_KEY = 'contacts'
+_HEADER = struct.Struct('<8sIIQQQQ')
+
+_current = None
+_next_check = 0.0
+_lock = threading.Lock()
+# Background thread loading a newer snapshot, if one is running
+_refresher = None
+# Serializes version checks and rebuilds within this process
+_refresh_lock = threading.Lock()
+
+
+class SnapshotError(Exception):
+    """Raised for missing, corrupt or incompatible snapshot files."""
+
+
+def read_db_version(session):
+    """Return (counter, row_count, max_id) describing the current contact data."""
+    row = session.get(DataVersion, VERSION_KEY)
+    row_count, max_id = session.query(func.count(Location.id), func.max(Location.id)).filter(
+        Location.query.is_(None)
+    ).one()
+    return (row.version if row else 0, row_count or 0, max_id or 0)
+
+
+def mark_changed(session):
+    """Bump the contacts version inside ``session`` (caller commits) so snapshots rebuild."""
+    upsert_add(session.connection(), DataVersion, {'name': VERSION_KEY}, 'version', 1)
+
+
+def _load_contacts(session):
+    """Return (id, latitude, longitude, name, phone) for every contact the nearest search uses."""
+    rows = session.query(
+        Location.id, Location.latitude, Location.longitude,
+        User.username, User.first_name
+    ).join(User, Location.user_id == User.id).filter(Location.query.is_(None)).order_by(Location.id).all()
+    contacts = []
+    for loc_id, latitude, longitude, username, first_name in rows:
+        try:
+            lat, lon = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            continue
+        # Same display name and phone formatting as the /number replies
+        contacts.append((loc_id, lat, lon, username or first_name or 'User', str(latitude).strip()))
+    return contacts
+
+
+def write_snapshot(path, contacts, db_version):
+    """Write ``contacts`` to ``path`` atomically."""
+    strings = {}
+    blob = bytearray()
+    offsets = array('I', [0])
+
+    def intern(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(offsets) - 1
+            blob.extend(value.encode('utf-8'))
+            offsets.append(len(blob))
+        return index
+
+    ids, lats, lons = array('q'), array('d'), array('d')
+    names, phones = array('I'), array('I')
+    for loc_id, lat, lon, name, phone in contacts:
+        ids.append(loc_id)
+        lats.append(lat)
+        lons.append(lon)
+        names.append(intern(name))
+        phones.append(intern(phone))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(ids), *db_version, len(offsets) - 1))
+        for column in (ids, lats, lons, names, phones):
+            f.write(column.tobytes())
+        f.write(offsets.tobytes())
+        f.write(bytes(blob))
+    os.replace(tmp_path, path)
+
+
+class ContactSnapshot:
+    """Read-only view over a mapped snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if len(view) < _HEADER.size:
+            raise SnapshotError(f"Snapshot {path} is truncated")
+        magic, fmt, count, counter, row_count, max_id, string_count = _HEADER.unpack_from(view)
+        self.db_version = (counter, row_count, max_id)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise SnapshotError(f"Snapshot {path} has an unsupported format")
+        self.count = count
+        pos = _HEADER.size
+        self.ids = view[pos:pos + count * 8].cast('q')
+        pos += count * 8
+        self.latitudes = view[pos:pos + count * 8].cast('d')
+        pos += count * 8
+        self.longitudes = view[pos:pos + count * 8].cast('d')
+        pos += count * 8
+        self.name_index = view[pos:pos + count * 4].cast('I')
+        pos += count * 4
+        self.phone_index = view[pos:pos + count * 4].cast('I')
+        pos += count * 4
+        self._offsets = view[pos:pos + (string_count + 1) * 4].cast('I')
+        pos += (string_count + 1) * 4
+        self._blob = view[pos:]
+        self._near_counts = {}
+
+    def string(self, index):
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]).decode('utf-8')
+
+    def nearest(self, lat, lon, limit=1):
+        """Return up to ``limit`` (name, phone, id) tuples ordered by L1 distance, like the old SQL."""
+        lats, lons = self.latitudes, self.longitudes
+        best = heapq.nsmallest(
+            limit, range(self.count),
+            key=lambda i: abs(lats[i] - lat) + abs(lons[i] - lon)
+        )
+        return [(self.string(self.name_index[i]), self.string(self.phone_index[i]), self.ids[i]) for i in best]
+
+    def count_within(self, lat, lon, radius_km):
+        """Number of contacts within ``radius_km`` of (lat, lon); cached for the life of this snapshot."""
+        key = (lat, lon, radius_km)
+        count = self._near_counts.get(key)
+        if count is None:
+            # Equirectangular approximation, fine at town scale
+            km_per_deg_lat = 111.32
+            km_per_deg_lon = km_per_deg_lat * max(math.cos(math.radians(lat)), 0.01)
+            dlat_max = radius_km / km_per_deg_lat
+            limit = radius_km * radius_km
+            lats, lons = self.latitudes, self.longitudes
+            count = 0
+            for i in range(self.count):
+                dlat = lats[i] - lat
+                if -dlat_max <= dlat <= dlat_max:
+                    dx = (lons[i] - lon) * km_per_deg_lon
+                    dy = dlat * km_per_deg_lat
+                    if dx * dx + dy * dy <= limit:
+                        count += 1
+            self._near_counts[key] = count
+        return count
+
+
+def rebuild(path=None):
+    """Rebuild the snapshot file from the database and return the new ContactSnapshot."""
+    from bot.database import ReadSessionLocal
+    path = path or config.CONTACT_SNAPSHOT_PATH
+    session = ReadSessionLocal()
+    try:
+        # Read the version first so concurrent changes make the snapshot stale, not wrong
+        version = read_db_version(session)
+        contacts = _load_contacts(session)
+    finally:
+        session.close()
+    start = time.perf_counter()
+    write_snapshot(path, contacts, version)
+    logging.info(f"Wrote contact snapshot {path}: {len(contacts)} contacts, version {version} "
+                 f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return ContactSnapshot(path)
+
+
+def _current_db_version():
+    from bot.database import ReadSessionLocal
+    session = ReadSessionLocal()
+    try:
+        return read_db_version(session)
+    finally:
+        session.close()
+
+
+def refresh():
+    """Map the snapshot for the current database version, rebuilding the file if it is stale."""
+    global _current
+    with _refresh_lock:
+        version = _current_db_version()
+        if _current is not None and _current.db_version == version:
+            return _current
+        path = config.CONTACT_SNAPSHOT_PATH
+        snapshot = None
+        try:
+            # Another process may already have written a current snapshot
+            snapshot = ContactSnapshot(path)
+        except (OSError, ValueError, SnapshotError):
+            pass
+        if snapshot is None or snapshot.db_version != version:
+            snapshot = rebuild(path)
+        _current = snapshot
+        return snapshot
+
+
+def _refresh_in_background():
+    global _refresher
+    try:
+        refresh()
+    except Exception as e:
+        logging.error(f"Contact snapshot refresh failed: {e}")
+    finally:
+        with _lock:
+            _refresher = None
+
+
+def warm():
+    """Start a background refresh unless one is running; returns its thread.
+
+    Called when the handlers load, so the first lookup finds the snapshot mapped.
+    """
+    global _refresher, _next_check
+    with _lock:
+        _next_check = time.monotonic() + config.CONTACT_SNAPSHOT_CHECK
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_in_background, name='contact-snapshot-refresh', daemon=True)
+            _refresher.start()
+        return _refresher
+
+
+def get_snapshot():
+    """Return the mapped snapshot, starting a background refresh every CONTACT_SNAPSHOT_CHECK seconds.
+
+    Only a lookup that finds no snapshot mapped yet waits for one to load.
+    """
+    snapshot = _current
+    if snapshot is None:
+        warm().join()
+        # If the background load failed, try here so the error reaches the caller
+        return _current or refresh()
+    if time.monotonic() >= _next_check:
+        warm()
+    return snapshot
+
+
+def nearest_contacts(lat, lon, limit=1):
+    """Nearest contacts to (lat, lon) as (name, phone, id) tuples."""
+    return get_snapshot().nearest(lat, lon, limit)
+
+
+def count_near(lat, lon, radius_km=None):
+    """Number of contacts within ``radius_km`` (default PLACE_CONTACT_RADIUS_KM) of (lat, lon)."""
+    return get_snapshot().count_within(lat, lon, radius_km or config.PLACE_CONTACT_RADIUS_KM)
+
+
+def reset():
+    """Forget the mapped snapshot (tests, forks)."""
+    global _current, _next_check
+    with _lock:
+        _current = None
+        _next_check = 0.0
@@ -1,20 +1,92 @@
 """Database setup and helper functions."""
 # Database setup for Supabase/PostgreSQL
-from sqlalchemy import create_engine
+import datetime as dt
+import threading
+from sqlalchemy import insert, inspect
 from sqlalchemy.orm import sessionmaker
-from bot import config
+from bot import config, contact_snapshot, rollups, user_directory
+from bot.engine import make_engine, pool_report as _pool_report
 from admin import models
 
-# Create database engine (Supabase/PostgreSQL)
-engine = create_engine(config.DATABASE_URL, echo=False, future=True)
+# Engines are created on first use rather than at import time, so importing
+# the bot package (tests, worker forks, tooling) does not touch the database.
+_engine = None
+_read_engine = None
+_engine_lock = threading.Lock()
 
-# Create session factory
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+def get_engine():
+    """Return the primary database engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = make_engine(config.DATABASE_URL, role='primary')
+    return _engine
 
-# Create tables if they don't exist
-models.Base.metadata.create_all(bind=engine)
+def get_read_engine():
+    """Return the engine for read-only queries (the replica if configured, else the primary)."""
+    global _read_engine
+    if not config.DATABASE_REPLICA_URL:
+        return get_engine()
+    if _read_engine is None:
+        with _engine_lock:
+            if _read_engine is None:
+                _read_engine = make_engine(config.DATABASE_REPLICA_URL, role='replica')
+    return _read_engine
 
-# Manual SQLite-specific table creation removed; all tables are managed via SQLAlchemy metadata
+def pool_report():
+    """Return pool occupancy and wait statistics for the engines created so far."""
+    engines = [(role, eng) for role, eng in (('primary', _engine), ('replica', _read_engine)) if eng is not None]
+    return _pool_report(engines) if engines else "no connections yet"
+
+def dispose_engines():
+    """Close the pooled connections of every engine created so far (primary and replica)."""
+    for eng in (_engine, _read_engine):
+        if eng is not None:
+            eng.dispose()
+
+class _LazySessionmaker(sessionmaker):
+    """Session factory that binds to its engine the first time a session is created."""
+    def __init__(self, engine_getter, **kw):
+        super().__init__(**kw)
+        self._engine_getter = engine_getter
+
+    def __call__(self, **local_kw):
+        if self.kw.get('bind') is None:
+            self.configure(bind=self._engine_getter())
+        return super().__call__(**local_kw)
+
+# Create session factories: SessionLocal for writes, ReadSessionLocal for read-only paths
+SessionLocal = _LazySessionmaker(get_engine, autoflush=False, autocommit=False)
+ReadSessionLocal = _LazySessionmaker(get_read_engine, autoflush=False, autocommit=False)
+
+def __getattr__(name):
+    # Keep `database.engine` working for existing callers without creating it at import
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_schema():
+    """Create tables if they don't exist (all tables are managed via SQLAlchemy metadata)."""
+    models.Base.metadata.create_all(bind=get_engine())
+    # Indexes on the users table, which create_all() leaves alone when it already exists
+    user_directory.ensure_indexes(get_engine())
+
+def check_replica():
+    """Raise RuntimeError if the read replica is missing tables (no-op without a replica).
+
+    Tables are only ever created on the primary, so a replica that is not a
+    copy or follower of it would fail on the first read instead.
+    """
+    if not config.DATABASE_REPLICA_URL:
+        return
+    existing = set(inspect(get_read_engine()).get_table_names())
+    missing = sorted(set(models.Base.metadata.tables) - existing)
+    if missing:
+        raise RuntimeError(
+            f"Read replica is missing tables: {', '.join(missing)}. "
+            "DATABASE_REPLICA_URL must point at a copy or follower of the primary database."
+        )
 
 # Initial admin user setup
 def init_admin_user():
@@ -26,6 +98,12 @@ def init_admin_user():
         if admin_user is None:
             # Create initial admin user with credentials from config
             from werkzeug.security import generate_password_hash
+            totp_secret = config.ADMIN_TOTP_SECRET
+            if not totp_secret:
+                # Only generate a TOTP secret when the admin is actually being created
+                import pyotp
+                totp_secret = pyotp.random_base32()
+                print(f"Generated TOTP secret for admin (save this for 2FA setup): {totp_secret}")
             admin = models.User(
                 telegram_id=None,
                 username=config.ADMIN_USERNAME,
@@ -34,7 +112,7 @@ def init_admin_user():
                 is_admin=True,
                 is_active=True,
                 password_hash=generate_password_hash(config.ADMIN_PASSWORD),
-                totp_secret=config.ADMIN_TOTP_SECRET
+                totp_secret=totp_secret
             )
             session.add(admin)
             session.commit()
@@ -43,9 +121,6 @@ def init_admin_user():
     finally:
         session.close()
 
-# Initialize admin user on startup
-init_admin_user()
-
 def get_user_by_telegram_id(session, telegram_id):
     return session.query(models.User).filter(models.User.telegram_id == telegram_id).first()
 
@@ -69,25 +144,32 @@ def ensure_user(telegram_user):
     """Get or create a user corresponding to the given Telegram user. Updates info if changed."""
     session = SessionLocal()
     user = get_user_by_telegram_id(session, telegram_user.id)
+    created = user is None
     if user:
         # Update basic info if changed
-        updated = False
+        updated = renamed = False
         if telegram_user.username and user.username != telegram_user.username:
             user.username = telegram_user.username
-            updated = True
+            updated = renamed = True
         # Only update name if not empty strings to avoid overwriting with None
         if telegram_user.first_name and user.first_name != telegram_user.first_name:
             user.first_name = telegram_user.first_name
-            updated = True
+            updated = renamed = True
         if telegram_user.last_name and user.last_name != telegram_user.last_name:
             user.last_name = telegram_user.last_name
             updated = True
+        if renamed:
+            # Contact snapshots show the username or first name
+            contact_snapshot.mark_changed(session)
         if updated:
             session.commit()
     else:
         # Create new user record
         user = create_user(session, telegram_user)
         session.commit()
+    # Record when the user was last seen (throttled per user; new users right away)
+    if user_directory.touch(session, user, force=created):
+        session.commit()
     # Cache id and username before detaching and closing session
     user_id = user.id
     user_username = user.username
@@ -115,22 +197,48 @@ def add_location_entry(user, latitude, longitude, address, query=None):
             query=query
         )
         session.add(loc)
+        if query is None:
+            # A new contact: let mapped contact snapshots know they are stale (search rows don't matter)
+            contact_snapshot.mark_changed(session)
         session.commit()
         session.refresh(loc)  # get generated id
         return loc
     finally:
         session.close()
 
+def save_analysis_results(rows):
+    """Bulk insert Loveable.dev analysis results.
+
+    ``rows`` is a list of (user_id, text, analysis_result dict) tuples; all rows
+    are written in a single executemany on a pooled connection.
+    """
+    if not rows:
+        return 0
+    values = analysis_values(rows)
+    with get_engine().begin() as conn:
+        write_analysis_results(conn, values)
+    return len(values)
+
+def analysis_values(rows):
+    """Turn (user_id, text, analysis_result) tuples into AnalysisResult insert values."""
+    now = dt.datetime.utcnow()
+    return [
+        {
+            'user_id': user_id,
+            'text': text,
+            'sentiment': analysis_result.get("sentiment"),
+            'details': str(analysis_result),
+            'created_at': now,
+        }
+        for user_id, text, analysis_result in rows
+    ]
+
+def write_analysis_results(conn, values):
+    """Insert analysis rows and update the rollups on ``conn`` (shared by the sync and async paths)."""
+    conn.execute(insert(models.AnalysisResult), values)
+    # Keep the hour/day sentiment rollups in step with the raw rows
+    rollups.record(conn, values)
+
 def save_analysis_result(user_id, text, analysis_result):
     """Save the Loveable.dev analysis result to the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO analysis_results (user_id, text, sentiment, details)
-        VALUES (?, ?, ?, ?)
-        """,
-        (user_id, text, analysis_result.get("sentiment"), str(analysis_result))
-    )
-    conn.commit()
-    conn.close()
+    save_analysis_results([(user_id, text, analysis_result)])
@@ -0,0 +1,110 @@
+# engine.py
+"""SQLAlchemy engine factory with tuned pooling and pool wait-time reporting."""
+import logging
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from bot import config
+
+# Pool statistics per engine role ('primary', 'replica')
+POOL_STATS = {}
+
+
+class PoolStats:
+    """Counters for connection checkouts, wait times and pool exhaustion."""
+
+    def __init__(self, role):
+        self.role = role
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.slow_waits = 0
+        self._lock = threading.Lock()
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if wait >= config.DB_POOL_SLOW_WAIT:
+                self.slow_waits += 1
+        if timed_out:
+            logging.error(f"Database pool '{self.role}' exhausted: no connection after {wait:.2f}s")
+        elif wait >= config.DB_POOL_SLOW_WAIT:
+            logging.warning(f"Waited {wait:.2f}s for a '{self.role}' database connection")
+
+    def as_dict(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'role': self.role,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'slow_waits': self.slow_waits,
+                'avg_wait_ms': (self.total_wait / attempts * 1000) if attempts else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+
+class _TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return conn
+
+
+def _is_memory_sqlite(url):
+    return url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///') or ':memory:' in url)
+
+
+def make_engine(url, role='primary'):
+    """Create an engine for ``url`` using the pool settings from config."""
+    if _is_memory_sqlite(url):
+        # In-memory SQLite uses a per-thread singleton pool; queue settings don't apply
+        return create_engine(url, echo=False, future=True)
+    stats = POOL_STATS.setdefault(role, PoolStats(role))
+    # Subclass per role so the stats survive pool recreation (engine.dispose())
+    poolclass = type(f"{role.title()}QueuePool", (_TimedQueuePool,), {'stats': stats})
+    return create_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=poolclass,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+
+
+def pool_report(engines):
+    """Return one line per engine with pool occupancy and wait statistics."""
+    lines = []
+    for role, engine in engines:
+        stats = POOL_STATS.get(role)
+        if stats is None:
+            lines.append(f"{role}: {engine.pool.status()}")
+            continue
+        s = stats.as_dict()
+        lines.append(
+            f"{role}: {engine.pool.status()} | checkouts {s['checkouts']}, "
+            f"avg wait {s['avg_wait_ms']:.1f} ms, max wait {s['max_wait_ms']:.1f} ms, "
+            f"slow {s['slow_waits']}, timeouts {s['timeouts']}"
+        )
+    return "\n".join(lines)
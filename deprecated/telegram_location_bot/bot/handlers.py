@@ -1,58 +1,71 @@
 """Handlers for standard bot commands and messages."""
 from bot import bot
+from bot import config
 from bot import database
 from bot import location
 from bot import rbac
 from bot.rate_limit import rate_limit
 from bot.utils import safe_reply
-from bot.loveable import analyze_text
-from sqlalchemy import func
-from flask import current_app
+from bot import analysis
+from bot import contact_snapshot
+from bot import place_index
+from bot.template_registry import registry
+from telebot import types
 import datetime as dt
+import hashlib
 import os
 
 # Only allow these commands at the start
 ALLOWED_COMMANDS = {'start', 'number', 'invite', 'numbers'}
 USER_STATE = {}
+# Prefix of the message sent when a user picks an inline place suggestion
+PLACE_MARKER = "📍 "
 
-# Helper to get the welcome message from config or database
+# Default reply templates, used while the template files are missing or invalid
+DEFAULT_WELCOME_MESSAGE = (
+    "Hey,\n\n"
+    "Welcome to the find a local Medic directory, Don't panic we got you covered.\n\n"
+    "As we are helping other members 24/7 in the Medic chat we have to enforce the following limits:\n\n"
+    "🎉 3 requests per 24hrs\n"
+    "⚡ 3 requests left for today\n\n"
+    "✨ <b>How to find a local Medic</b>\n\n"
+    "To find a local Medic simply click <b>/number</b>\n\n"
+    "Click <b>/help</b> for an array of other, tempting commands.\n\n"
+    "If you need your limit raised for whatever please ask an admin in the chat or press <b>/help</b>\n\n"
+    "Thank you, and we hope to see you again\n\n"
+    "🎉 3 requests per 24hrs\n"
+    "⚡ 3 requests left for today"
+)
+DEFAULT_NUMBERS_TEMPLATE = (
+    "Hello {username},\n\n"
+    "Here are numbers near: {address}\n\n"
+    "{numbers}\n\n"
+    "✂️ Tap the number to copy\n"
+    "⚠️ All distances are approximate\n"
+    "⚠️ Use at your own risk. Never pay upfront."
+)
+DEFAULT_NUMBERS_ENTRY = (
+    "⭐️ {name}\n"
+    "Phone: {phone}\n"
+    "🔒 Start your message on WhatsApp with password NIGELLA to get the full menu\n\n"
+)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), '../templates')
+
+# Register reply templates once; edits are picked up by the registry's mtime check
+# The welcome file predates placeholders and may contain braces, so it is sent verbatim
+registry.register('welcome', 'welcome_message.txt', default=DEFAULT_WELCOME_MESSAGE, raw=True)
+registry.register('numbers', os.path.join(TEMPLATE_DIR, 'numbers_template.txt'),
+                  placeholders=('username', 'address', 'numbers'), default=DEFAULT_NUMBERS_TEMPLATE)
+registry.register('numbers_entry', os.path.join(TEMPLATE_DIR, 'numbers_entry.txt'),
+                  placeholders=('name', 'phone'), default=DEFAULT_NUMBERS_ENTRY)
+
+# Map the contact snapshot in the background so the first lookup finds it ready
+contact_snapshot.warm()
+
+# Helper to get the welcome message (served from the template registry)
 def get_welcome_message():
-    # In production, this could be loaded from the database or a config file
-    # For now, try to read from a file, fallback to default
-    try:
-        with open('welcome_message.txt', 'r', encoding='utf-8') as f:
-            return f.read()
-    except Exception:
-        return (
-            "Hey,\n\n"
-            "Welcome to the find a local Medic directory, Don't panic we got you covered.\n\n"
-            "As we are helping other members 24/7 in the Medic chat we have to enforce the following limits:\n\n"
-            "🎉 3 requests per 24hrs\n"
-            "⚡ 3 requests left for today\n\n"
-            "✨ <b>How to find a local Medic</b>\n\n"
-            "To find a local Medic simply click <b>/number</b>\n\n"
-            "Click <b>/help</b> for an array of other, tempting commands.\n\n"
-            "If you need your limit raised for whatever please ask an admin in the chat or press <b>/help</b>\n\n"
-            "Thank you, and we hope to see you again\n\n"
-            "🎉 3 requests per 24hrs\n"
-            "⚡ 3 requests left for today"
-        )
-
-# Load template for /numbers command
-def load_numbers_template():
-    template_path = os.path.join(os.path.dirname(__file__), '../templates/numbers_template.txt')
-    try:
-        with open(template_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
-        return (
-            "Hello {username},\n\n"
-            "Here are numbers near: {address}\n\n"
-            "{numbers}\n\n"
-            "✂️ Tap the number to copy\n"
-            "⚠️ All distances are approximate\n"
-            "⚠️ Use at your own risk. Never pay upfront."
-        )
+    return registry.render('welcome')
 
 # Handle /start command
 @bot.message_handler(commands=['start'])
@@ -96,6 +109,113 @@ def number_command(message):
     print(f"[DEBUG] Set user {user.id} state to 'awaiting_location'")
     safe_reply(bot, message, "📍 Please enter a location or postcode to search for numbers near you.")
 
+def record_search(user, query, lat, lon, address):
+    """Log a successful search as a history row (the /start quota; archived by bot.retention)."""
+    try:
+        database.add_location_entry(user, lat, lon, address, query=query)
+    except Exception as e:
+        print(f"[ERROR] Failed to record search: {str(e)}")
+
+def render_number_reply(user, address, contact_name, phone_number):
+    """HTML reply for /number with the single closest contact."""
+    return (
+        f"Hello {user.first_name or user.username or 'there'},\n\n"
+        f"Here is 1 number near: {address}\n\n"
+        f"⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️\n"
+        f"<b>{contact_name}</b>\n"
+        f"<a href='tel:{phone_number}'>{phone_number}</a>\n"
+        f"🔒 Start your message on WhatsApp with password NIGELLA to get the full menu\n"
+        f"⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️\n\n"
+        f"✂️ Tap the number to copy\n"
+        f"⚠️ All distances are approximate\n"
+        f"⚠️ Use at your own risk. Never pay upfront."
+    )
+
+def render_numbers_reply(user, address, closest_results):
+    """Plain-text reply for /numbers, rendered from the compiled numbers templates."""
+    numbers_section = registry.render_many('numbers_entry', (
+        {'name': contact_name, 'phone': phone_number}
+        for contact_name, phone_number, _ in closest_results
+    ))
+    return registry.render(
+        'numbers',
+        username=user.first_name or user.username or 'there',
+        address=address,
+        numbers=numbers_section
+    )
+
+def reply_with_numbers(message, user, lat, lon, address):
+    """Reply with the contacts closest to (lat, lon), rendered from the numbers templates."""
+    # Find the closest contacts in the memory-mapped contact snapshot
+    try:
+        closest_results = contact_snapshot.nearest_contacts(lat, lon, limit=5)
+
+        print(f"[DEBUG] Closest results: {closest_results}")
+
+        if not closest_results:
+            safe_reply(bot, message, "No records found near that location.")
+            return
+
+        reply = render_numbers_reply(user, address, closest_results)
+        print(f"[DEBUG] Final reply: {reply}")
+        safe_reply(bot, message, reply, parse_mode=None, disable_web_page_preview=True)
+    except Exception as e:
+        print(f"[ERROR] Exception occurred: {str(e)}")
+        safe_reply(bot, message, f"❌ An error occurred: {str(e)}")
+
+# Inline mode: "@bot harro" suggests known places and postcode districts from the prefix index
+place_index.index.warm()
+
+def inline_place_results(text):
+    """Inline suggestions for ``text``: matching places with their nearby contact counts."""
+    results = []
+    for place in place_index.index.search(text, limit=config.INLINE_MAX_RESULTS):
+        try:
+            nearby = contact_snapshot.count_near(place.latitude, place.longitude)
+            description = f"{nearby} contact{'s' if nearby != 1 else ''} nearby"
+        except Exception as e:
+            print(f"[ERROR] Could not count contacts near {place.name}: {e}")
+            description = place.address
+        results.append(types.InlineQueryResultArticle(
+            id=hashlib.md5(place.name.encode('utf-8')).hexdigest(),
+            title=place.name,
+            description=description,
+            input_message_content=types.InputTextMessageContent(f"{PLACE_MARKER}{place.name}")
+        ))
+    return results
+
+@bot.inline_handler(func=lambda query: len(query.query.strip()) >= 2)
+def inline_place_query(query):
+    results = inline_place_results(query.query)
+    try:
+        bot.answer_inline_query(query.id, results, cache_time=60)
+    except Exception as e:
+        print(f"[ERROR] Failed to answer inline query: {e}")
+
+# A chosen suggestion arrives as a message sent via this bot; search its known coordinates directly
+@bot.message_handler(func=lambda msg: msg.content_type == 'text' and msg.via_bot is not None
+                     and msg.text.startswith(PLACE_MARKER))
+@rate_limit(limit_sec=2)
+def handle_inline_place(message):
+    user = database.ensure_user(message.from_user)
+    if not user.is_active:
+        return
+    name = message.text[len(PLACE_MARKER):].strip()
+    place = place_index.index.lookup(name)
+    if place is None:
+        # Not indexed in this process (yet); fall back to the geocoder
+        geo_result = location.geocode_address(name)
+        if not geo_result:
+            safe_reply(bot, message, f"❌ Could not find any location for: {name}")
+            return
+        place_index.index.learn_geocode(name, geo_result)
+        lat, lon, address = geo_result
+    else:
+        lat, lon, address = place.latitude, place.longitude, place.address
+    record_search(user, name, lat, lon, address)
+    reply_with_numbers(message, user, lat, lon, address)
+    USER_STATE[user.id] = 'start'
+
 @bot.message_handler(func=lambda msg: USER_STATE.get(msg.from_user.id) == 'awaiting_location' and msg.content_type == 'text')
 @rate_limit(limit_sec=2)
 def handle_location_query(message):
@@ -113,41 +233,24 @@ def handle_location_query(message):
 
     lat, lon, address = geo_result
     print(f"[DEBUG] Geocoded location: {lat}, {lon}, {address}")
+    record_search(user, location_query, lat, lon, address)
+    place_index.index.learn_geocode(location_query, geo_result)
 
-    # Find the closest record in the database
-    session = database.SessionLocal()
+    # Find the closest contact in the memory-mapped contact snapshot
     try:
-        closest_result = session.query(database.models.Location, database.models.User).join(database.models.User).order_by(
-            func.abs(func.cast(database.models.Location.latitude, func.FLOAT) - lat) +
-            func.abs(func.cast(database.models.Location.longitude, func.FLOAT) - lon)
-        ).first()
+        closest_results = contact_snapshot.nearest_contacts(lat, lon, limit=1)
 
-        if not closest_result:
+        if not closest_results:
             safe_reply(bot, message, "No records found near that location.")
             return
 
-        loc, loc_user = closest_result
-        phone_number = str(loc.latitude).strip()  # Ensure phone number is properly formatted
+        contact_name, phone_number, _ = closest_results[0]
         print(f"[DEBUG] Found phone number: {phone_number}")
-        
-        reply = (
-            f"Hello {user.first_name or user.username or 'there'},\n\n"
-            f"Here is 1 number near: {address}\n\n"
-            f"⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️\n"
-            f"<b>{loc_user.username or loc_user.first_name or 'User'}</b>\n"
-            f"<a href='tel:{phone_number}'>{phone_number}</a>\n"
-            f"🔒 Start your message on WhatsApp with password NIGELLA to get the full menu\n"
-            f"⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️⭐️\n\n"
-            f"✂️ Tap the number to copy\n"
-            f"⚠️ All distances are approximate\n"
-            f"⚠️ Use at your own risk. Never pay upfront."
-        )
+        reply = render_number_reply(user, address, contact_name, phone_number)
         safe_reply(bot, message, reply, parse_mode='HTML', disable_web_page_preview=True)
     except Exception as e:
         print(f"[ERROR] Exception occurred: {str(e)}")
         safe_reply(bot, message, f"❌ An error occurred: {str(e)}")
-    finally:
-        session.close()
 
     # Reset state so user must use /number again
     USER_STATE[user.id] = 'start'
@@ -179,47 +282,10 @@ def handle_numbers_query(message):
 
     lat, lon, address = geo_result
     print(f"[DEBUG] Geocoded location: {lat}, {lon}, {address}")
+    record_search(user, location_query, lat, lon, address)
+    place_index.index.learn_geocode(location_query, geo_result)
 
-    # Find the closest records in the database
-    session = database.SessionLocal()
-    try:
-        closest_results = session.query(database.models.Location, database.models.User).join(database.models.User).order_by(
-            func.abs(func.cast(database.models.Location.latitude, func.FLOAT) - lat) +
-            func.abs(func.cast(database.models.Location.longitude, func.FLOAT) - lon)
-        ).limit(5).all()
-
-        print(f"[DEBUG] Closest results: {closest_results}")
-
-        if not closest_results:
-            safe_reply(bot, message, "No records found near that location.")
-            return
-
-        # Load the template
-        template = load_numbers_template()
-
-        # Format the numbers section
-        numbers_section = ""
-        for loc, loc_user in closest_results:
-            phone_number = str(loc.latitude).strip()  # Ensure phone number is properly formatted
-            numbers_section += (
-                f"⭐️ {loc_user.username or loc_user.first_name or 'User'}\n"
-                f"Phone: {phone_number}\n"
-                f"🔒 Start your message on WhatsApp with password NIGELLA to get the full menu\n\n"
-            )
-
-        # Format the final reply
-        reply = template.format(
-            username=user.first_name or user.username or 'there',
-            address=address,
-            numbers=numbers_section
-        )
-        print(f"[DEBUG] Final reply: {reply}")
-        safe_reply(bot, message, reply, parse_mode=None, disable_web_page_preview=True)
-    except Exception as e:
-        print(f"[ERROR] Exception occurred: {str(e)}")
-        safe_reply(bot, message, f"❌ An error occurred: {str(e)}")
-    finally:
-        session.close()
+    reply_with_numbers(message, user, lat, lon, address)
 
     # Reset state so user must use /numbers again
     USER_STATE[user.id] = 'start'
@@ -238,5 +304,8 @@ def fallback(message):
     # Check if it looks like a location query but state is wrong
     if message.text and not message.text.startswith('/'):
         print(f"[DEBUG] Text message received in fallback: {message.text}")
+        if config.ANALYZE_USER_MESSAGES:
+            # Sentiment analysis runs in the background pipeline, never inline
+            analysis.enqueue(user.id, message.text)
         
     safe_reply(bot, message, "❓ Please use /number to search for a number, or /invite to invite a friend.")
@@ -8,6 +8,14 @@ GEOCODE_URL = "https://nominatim.openstreetmap.org/search"
 REVERSE_URL = "https://nominatim.openstreetmap.org/reverse"
 HEADERS = {"User-Agent": "TelegramLocationBot/1.0"}
 
+class GeocodeResult(tuple):
+    """(lat, lon, address), plus the Nominatim result ``kind`` (addresstype) and ``name``."""
+    def __new__(cls, lat, lon, address, kind=None, name=None):
+        result = super().__new__(cls, (lat, lon, address))
+        result.kind = kind
+        result.name = name
+        return result
+
 def geocode_address(query: str) -> Optional[Tuple[float, float, str]]:
     """Geocode an address or place name to latitude, longitude, and address string.
     Returns (lat, lon, address) or None if not found."""
@@ -21,16 +29,40 @@ def geocode_address(query: str) -> Optional[Tuple[float, float, str]]:
         logging.debug(f"[DEBUG] Geocoding query: {query}")
         resp = requests.get(GEOCODE_URL, params=params, headers=HEADERS, timeout=5)
         resp.raise_for_status()
-        data = resp.json()
-        logging.debug(f"[DEBUG] Geocoding response: {data}")
-        if not data:
-            return None
-        result = data[0] if isinstance(data, list) else data
-        lat = float(result.get("lat"))
-        lon = float(result.get("lon"))
-        address = result.get("display_name", "").strip()
-        logging.debug(f"[DEBUG] Parsed geocoding result: lat={lat}, lon={lon}, address={address}")
-        return lat, lon, address
+        return _parse_geocode(resp.json())
+    except Exception as e:
+        logging.error(f"Geocoding error: {e}")
+        return None
+
+def _parse_geocode(data) -> Optional[Tuple[float, float, str]]:
+    logging.debug(f"[DEBUG] Geocoding response: {data}")
+    if not data:
+        return None
+    result = data[0] if isinstance(data, list) else data
+    lat = float(result.get("lat"))
+    lon = float(result.get("lon"))
+    address = result.get("display_name", "").strip()
+    # addresstype is the finest level the result names (city, road, postcode, ...)
+    kind = result.get("addresstype") or (result.get("type") if result.get("class") == "place" else None)
+    logging.debug(f"[DEBUG] Parsed geocoding result: lat={lat}, lon={lon}, address={address}, kind={kind}")
+    return GeocodeResult(lat, lon, address, kind, result.get("name") or None)
+
+async def geocode_address_async(query: str) -> Optional[Tuple[float, float, str]]:
+    """Async version of geocode_address() for the asyncio runtime (shared aiohttp session)."""
+    import aiohttp
+    from bot import async_http
+    try:
+        params = {
+            "q": query,
+            "format": "json",
+            "limit": 1,
+            "addressdetails": 0
+        }
+        logging.debug(f"[DEBUG] Geocoding query: {query}")
+        async with async_http.get_session().get(GEOCODE_URL, params=params, headers=HEADERS,
+                                                timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            resp.raise_for_status()
+            return _parse_geocode(await resp.json(content_type=None))
     except Exception as e:
         logging.error(f"Geocoding error: {e}")
         return None
@@ -1,19 +1,48 @@
 import os
 import requests
+from bot import config
 
-def analyze_text(text):
-    """Send text to Loveable.dev API for analysis."""
+# Pooled HTTP session so connections to the analysis API are reused
+_session = requests.Session()
+_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=config.ANALYSIS_WORKERS * 2))
+_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=config.ANALYSIS_WORKERS * 2))
+
+def request_analysis(text, timeout=None):
+    """Send text to Loveable.dev API for analysis, raising on HTTP or network errors."""
     api_key = os.getenv("LOVEABLE_API_KEY")
     if not api_key:
         raise ValueError("LOVEABLE_API_KEY is not set in the environment variables.")
 
-    url = "https://api.loveable.dev/analyze"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {"text": text}
+    response = _session.post(config.LOVEABLE_API_URL, json=payload, headers=headers,
+                             timeout=timeout or config.ANALYSIS_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
 
-    try:
-        response = requests.post(url, json=payload, headers=headers)
+async def request_analysis_async(text, timeout=None):
+    """Async version of request_analysis() for the asyncio runtime; raises aiohttp errors."""
+    import aiohttp
+    from bot import async_http
+    api_key = os.getenv("LOVEABLE_API_KEY")
+    if not api_key:
+        raise ValueError("LOVEABLE_API_KEY is not set in the environment variables.")
+
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    payload = {"text": text}
+    async with async_http.get_session().post(
+        config.LOVEABLE_API_URL, json=payload, headers=headers,
+        timeout=aiohttp.ClientTimeout(total=timeout or config.ANALYSIS_TIMEOUT)
+    ) as response:
         response.raise_for_status()
-        return response.json()
+        return await response.json(content_type=None)
+
+def analyze_text(text):
+    """Send text to Loveable.dev API for analysis.
+
+    Blocking; handlers should use bot.analysis.enqueue() instead.
+    """
+    try:
+        return request_analysis(text)
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
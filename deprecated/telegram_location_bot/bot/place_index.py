@@ -0,0 +1,226 @@
+# place_index.py
+"""In-memory prefix index over place names and postcode districts for inline autocomplete.
+
+Places come from three sources:
+
+- PLACES_FILE, a CSV of name, latitude, longitude, address. No gazetteer is
+  shipped; load one into this file to suggest towns nobody has searched for.
+- The postcode districts in contact addresses, read when the index warms up,
+  so districts with contacts are suggested on a fresh deploy.
+- Geocodes that name a settlement or a bare postcode district, which are
+  appended to PLACES_FILE. Without a gazetteer, "harro" suggests Harrogate
+  only once someone has searched for it.
+
+Street addresses and full postcodes are never learned: suggestions are shared
+by every user, and those would reveal where someone searched. Lookups are a
+bisect into a sorted key list plus a per-prefix result cache, so suggestions
+return without touching the database or the geocoder.
+"""
+import bisect
+import csv
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from bot import config
+
+# UK postcode: outward code (district) and optional inward code
+POSTCODE_RE = re.compile(r'^([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})?$', re.IGNORECASE)
+# A full UK postcode inside an address ("..., Harrogate, HG1 2RS, United Kingdom")
+ADDRESS_POSTCODE_RE = re.compile(r'\b([A-Z]{1,2}\d[A-Z\d]?) ?\d[A-Z]{2}\b')
+PREFIX_CACHE_SIZE = 2048
+# Nominatim addresstypes naming a whole settlement, safe to suggest to everyone
+SETTLEMENT_TYPES = frozenset({
+    'city', 'town', 'village', 'hamlet', 'suburb', 'borough', 'quarter', 'neighbourhood', 'municipality',
+})
+
+
+class Place:
+    __slots__ = ('name', 'latitude', 'longitude', 'address')
+
+    def __init__(self, name, latitude, longitude, address=''):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.address = address or name
+
+
+def normalize(text):
+    return " ".join(text.split()).lower()
+
+
+def display_name(query):
+    """Canonical display form: postcodes upper-cased, place names title-cased."""
+    text = " ".join(query.split())
+    match = POSTCODE_RE.match(text)
+    if match:
+        return " ".join(part.upper() for part in match.groups() if part)
+    return text.title()
+
+
+class PlaceIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self._keys = []      # sorted normalized keys
+        self._places = {}    # normalized key -> Place
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                    for row in csv.reader(f):
+                        try:
+                            place = Place(row[0], float(row[1]), float(row[2]), row[3] if len(row) > 3 else '')
+                        except (IndexError, ValueError):
+                            continue
+                        self._add(place, keep_sorted=False)
+                # One sort instead of an insort per row
+                self._keys.sort()
+                logging.info(f"Loaded {len(self._keys)} places from {self.path}")
+            self._loaded = True
+
+    def warm(self, seed_contacts=True):
+        """Load the places file, then the contacts' postcode districts, in a background thread.
+
+        The first inline query doesn't pay for either.
+        """
+        def load():
+            self._ensure_loaded()
+            if seed_contacts:
+                try:
+                    self.seed(contact_districts())
+                except Exception as e:
+                    logging.warning(f"Could not seed places from contact addresses: {e}")
+
+        thread = threading.Thread(target=load, name='place-index-load', daemon=True)
+        thread.start()
+        return thread
+
+    def seed(self, places):
+        """Index ``places`` in memory only (they are not written to the places file)."""
+        self._ensure_loaded()
+        with self._lock:
+            for place in places:
+                self._add(place, keep_sorted=False)
+            self._keys.sort()
+
+    def _add(self, place, keep_sorted=True):
+        """Index ``place`` by name and, for postcodes, by district. Returns True if anything was new."""
+        keys = [normalize(place.name)]
+        match = POSTCODE_RE.match(place.name)
+        if match and match.group(2):
+            keys.append(normalize(match.group(1)))
+        added = False
+        for key in keys:
+            if key in self._places:
+                continue
+            entry = place if key == keys[0] else Place(match.group(1).upper(), place.latitude, place.longitude, place.address)
+            self._places[key] = entry
+            if keep_sorted:
+                bisect.insort(self._keys, key)
+            else:
+                self._keys.append(key)
+            added = True
+        if added:
+            self._cache.clear()
+        return added
+
+    def learn(self, query, latitude, longitude, address=''):
+        """Remember a successful geocode so it can be suggested later."""
+        self._ensure_loaded()
+        place = Place(display_name(query), latitude, longitude, address)
+        with self._lock:
+            if not self._add(place):
+                return
+            if self.path:
+                try:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                        csv.writer(f).writerow([place.name, place.latitude, place.longitude, place.address])
+                except OSError as e:
+                    logging.warning(f"Could not persist place '{place.name}': {e}")
+
+    def learn_geocode(self, query, result):
+        """Learn a geocode result (bot.location.GeocodeResult) if it is a settlement or postcode district."""
+        latitude, longitude, address = result
+        kind = getattr(result, 'kind', None)
+        if kind in SETTLEMENT_TYPES:
+            self.learn(getattr(result, 'name', None) or query, latitude, longitude, address)
+        elif kind == 'postcode':
+            match = POSTCODE_RE.match(" ".join(query.split()))
+            if match and not match.group(2):
+                district = match.group(1).upper()
+                self.learn(district, latitude, longitude, district)
+
+    def search(self, prefix, limit=10):
+        """Return up to ``limit`` places whose name or district starts with ``prefix``."""
+        self._ensure_loaded()
+        key = normalize(prefix)
+        if not key:
+            return []
+        cache_key = (key, limit)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+            results = []
+            seen = set()
+            keys = self._keys
+            position = bisect.bisect_left(keys, key)
+            while position < len(keys) and len(results) < limit and keys[position].startswith(key):
+                place = self._places[keys[position]]
+                position += 1
+                if place.name not in seen:
+                    seen.add(place.name)
+                    results.append(place)
+            self._cache[cache_key] = results
+            if len(self._cache) > PREFIX_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return results
+
+    def lookup(self, name):
+        """Exact (case-insensitive) lookup of a place or district."""
+        self._ensure_loaded()
+        return self._places.get(normalize(name))
+
+
+def contact_districts():
+    """Postcode districts found in contact addresses, each placed at the mean position of its contacts."""
+    from bot.database import ReadSessionLocal
+    from admin.models import Location
+    totals = {}
+    session = ReadSessionLocal()
+    try:
+        rows = session.query(Location.latitude, Location.longitude, Location.address).filter(
+            Location.query.is_(None), Location.address.isnot(None)
+        )
+        for latitude, longitude, address in rows.yield_per(1000):
+            match = ADDRESS_POSTCODE_RE.search(address)
+            if not match:
+                continue
+            try:
+                lat, lon = float(latitude), float(longitude)
+            except (TypeError, ValueError):
+                continue
+            total = totals.setdefault(match.group(1), [0.0, 0.0, 0])
+            total[0] += lat
+            total[1] += lon
+            total[2] += 1
+    finally:
+        session.close()
+    return [Place(district, lat / n, lon / n, district) for district, (lat, lon, n) in totals.items()]
+
+
+# Shared index used by the inline query handler
+index = PlaceIndex(config.PLACES_FILE)
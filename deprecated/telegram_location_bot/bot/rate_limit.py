@@ -1,7 +1,8 @@
 # rate_limit.py
 """Rate limiting decorator to prevent spam from users."""
 import time
-from bot import bot
+from functools import wraps
+from bot import bot, config, get_async_bot
 
 # Track last command timestamp per user
 _last_time = {}
@@ -10,6 +11,8 @@ def rate_limit(limit_sec=1):
     """Decorator to limit how frequently a user can invoke a handler (in seconds)."""
     def decorator(func):
         def wrapper(message, *args, **kwargs):
+            if config.RATE_LIMIT_DISABLED:
+                return func(message, *args, **kwargs)
             user_id = message.from_user.id
             now = time.time()
             last = _last_time.get(user_id)
@@ -26,3 +29,24 @@ def rate_limit(limit_sec=1):
             return func(message, *args, **kwargs)
         return wrapper
     return decorator
+
+def async_rate_limit(limit_sec=1):
+    """rate_limit() for coroutine handlers in the asyncio runtime; shares the same timestamps."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(message, *args, **kwargs):
+            if config.RATE_LIMIT_DISABLED:
+                return await func(message, *args, **kwargs)
+            user_id = message.from_user.id
+            now = time.time()
+            last = _last_time.get(user_id)
+            if last and (now - last < limit_sec):
+                try:
+                    await get_async_bot().reply_to(message, "\u26a0\ufe0f Please slow down. You are sending commands too quickly.")
+                except Exception as e:
+                    print(f"Rate limit warning failed to send: {e}")
+                return
+            _last_time[user_id] = now
+            return await func(message, *args, **kwargs)
+        return wrapper
+    return decorator
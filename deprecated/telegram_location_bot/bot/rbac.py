@@ -1,19 +1,95 @@
 # rbac.py
 """Role-based access control for bot commands."""
+import logging
+import threading
+import time
 from functools import wraps
-from bot import bot, database
+from bot import bot, config, database, get_async_bot
+from bot.auth_versions import bump
+from admin.models import AuthVersion
 
-def is_user_admin(telegram_id):
-    """Check if the user with given Telegram ID is an admin and active."""
+# Name of the auth_versions row bumped whenever admin membership changes
+ADMIN_VERSION_KEY = 'admins'
+
+# In-memory set of active admin telegram ids. Refreshed when invalidated, when the
+# shared version counter changes (other processes) or after ADMIN_CACHE_TTL.
+_admin_ids = None
+_admin_version = None
+_loaded_at = 0.0
+_next_version_check = 0.0
+_cache_lock = threading.Lock()
+
+def _read_admin_version(session):
+    row = session.get(AuthVersion, ADMIN_VERSION_KEY)
+    return row.version if row else 0
+
+def _load_admin_ids():
+    """Load the active admin telegram ids and the current admin version."""
+    session = database.SessionLocal()
+    try:
+        rows = session.query(database.models.User.telegram_id).filter(
+            database.models.User.is_admin == True,
+            database.models.User.is_active == True,
+            database.models.User.telegram_id.isnot(None)
+        ).all()
+        return frozenset(row[0] for row in rows), _read_admin_version(session)
+    finally:
+        session.close()
+
+def _current_version():
     session = database.SessionLocal()
     try:
-        user = database.get_user_by_telegram_id(session, telegram_id)
-        if not user:
-            return False
-        return bool(user.is_admin and user.is_active)
+        return _read_admin_version(session)
     finally:
         session.close()
 
+def get_admin_ids():
+    """Return the cached set of active admin telegram ids, refreshing it if stale."""
+    global _admin_ids, _admin_version, _loaded_at, _next_version_check
+    now = time.monotonic()
+    admin_ids = _admin_ids
+    if admin_ids is not None and now - _loaded_at < config.ADMIN_CACHE_TTL and now < _next_version_check:
+        return admin_ids
+    with _cache_lock:
+        if _admin_ids is not None and now - _loaded_at < config.ADMIN_CACHE_TTL:
+            if now < _next_version_check:
+                return _admin_ids
+            # Cheap check for changes made by other processes
+            _next_version_check = now + config.ADMIN_CACHE_VERSION_CHECK
+            try:
+                if _current_version() == _admin_version:
+                    return _admin_ids
+            except Exception as e:
+                logging.warning(f"Admin version check failed, keeping cached admins: {e}")
+                return _admin_ids
+        _admin_ids, _admin_version = _load_admin_ids()
+        _loaded_at = now
+        _next_version_check = now + config.ADMIN_CACHE_VERSION_CHECK
+        return _admin_ids
+
+def invalidate_admin_cache():
+    """Drop the cached admin set and bump the shared version so other processes reload.
+
+    Call after committing any change to admin membership or user activation
+    (promote, demote, deactivate).
+    """
+    global _admin_ids
+    session = database.SessionLocal()
+    try:
+        bump(session, ADMIN_VERSION_KEY)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logging.error(f"Failed to bump admin version: {e}")
+    finally:
+        session.close()
+    with _cache_lock:
+        _admin_ids = None
+
+def is_user_admin(telegram_id):
+    """Check if the user with given Telegram ID is an admin and active."""
+    return telegram_id in get_admin_ids()
+
 def admin_required(func):
     """Decorator for bot command handlers to restrict to admin users only."""
     @wraps(func)
@@ -27,3 +103,56 @@ def admin_required(func):
             return
         return func(message, *args, **kwargs)
     return wrapper
+
+async def _load_admin_ids_async():
+    from sqlalchemy import select
+    from bot.async_database import AsyncSessionLocal
+    User = database.models.User
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(User.telegram_id).where(
+            User.is_admin == True,
+            User.is_active == True,
+            User.telegram_id.isnot(None)
+        ))
+        admin_ids = frozenset(result.scalars())
+        row = await session.get(AuthVersion, ADMIN_VERSION_KEY)
+        return admin_ids, row.version if row else 0
+
+async def get_admin_ids_async():
+    """get_admin_ids() for the asyncio runtime: same cache, refreshed through the async engine."""
+    global _admin_ids, _admin_version, _loaded_at, _next_version_check
+    now = time.monotonic()
+    admin_ids = _admin_ids
+    if admin_ids is not None and now - _loaded_at < config.ADMIN_CACHE_TTL:
+        if now < _next_version_check:
+            return admin_ids
+        _next_version_check = now + config.ADMIN_CACHE_VERSION_CHECK
+        try:
+            from bot.async_database import AsyncSessionLocal
+            async with AsyncSessionLocal() as session:
+                row = await session.get(AuthVersion, ADMIN_VERSION_KEY)
+            if (row.version if row else 0) == _admin_version:
+                return admin_ids
+        except Exception as e:
+            logging.warning(f"Admin version check failed, keeping cached admins: {e}")
+            return admin_ids
+    admin_ids, version = await _load_admin_ids_async()
+    # Delegated admin commands run in threads and read the same cache
+    with _cache_lock:
+        _admin_ids, _admin_version = admin_ids, version
+        _loaded_at = now
+        _next_version_check = now + config.ADMIN_CACHE_VERSION_CHECK
+    return admin_ids
+
+def async_admin_required(func):
+    """admin_required() for coroutine handlers in the asyncio runtime."""
+    @wraps(func)
+    async def wrapper(message, *args, **kwargs):
+        if message.from_user.id not in await get_admin_ids_async():
+            try:
+                await get_async_bot().reply_to(message, "\u26d4 You are not authorized to use this command.")
+            except Exception as e:
+                print(f"Failed to send unauthorized message: {e}")
+            return
+        return await func(message, *args, **kwargs)
+    return wrapper
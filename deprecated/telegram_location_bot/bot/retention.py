@@ -0,0 +1,172 @@
+# retention.py
+"""Hot/cold retention for location search history.
+
+Only the last RETENTION_DAYS of search history stay in the ``locations``
+table, so hot queries (the 24h quota count in /start, dashboard counts,
+admin listings) work on a small, indexed table. Older search rows are moved
+in batches to gzip CSV files under ARCHIVE_DIR (one file per batch and day),
+and per-day/per-user counts are kept in ``location_daily_stats`` so history
+reports still add up. A batch's files are written under a temporary name and
+only renamed into place once its DELETE has committed, so rows are never
+archived twice; files left behind by a crash are settled on the next pass.
+
+Search history rows are the ones with a ``query``, written by the /number
+and /numbers handlers for every successful search; contact rows (no query)
+are never archived.
+
+Run one pass manually:
+    python -m bot.retention
+"""
+import csv
+import datetime as dt
+import glob
+import gzip
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from sqlalchemy import Index, delete, func, select
+from bot import config
+from bot.rollups import upsert_add
+from admin.models import Location, LocationDailyStat
+
+ARCHIVE_COLUMNS = ('id', 'user_id', 'latitude', 'longitude', 'address', 'query', 'timestamp')
+
+# Index the hot-path quota count (user, recent timestamps) relies on
+HOT_INDEX = Index('ix_locations_user_id_timestamp', Location.user_id, Location.timestamp)
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def ensure_indexes(engine):
+    HOT_INDEX.create(bind=engine, checkfirst=True)
+
+def _archive_path(day, first_id, last_id):
+    """<ARCHIVE_DIR>/locations/<day>/<first id>-<last id>.csv.gz for one batch's rows from ``day``."""
+    return os.path.join(config.ARCHIVE_DIR, 'locations', day.isoformat(), f"{first_id}-{last_id}.csv.gz")
+
+def _write_archive(rows):
+    """Write ``rows`` to per-day gzip files under temporary names; returns the final paths."""
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(row.timestamp.date(), []).append(row)
+    paths = []
+    for day, day_rows in by_day.items():
+        path = _archive_path(day, day_rows[0].id, day_rows[-1].id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(f"{path}.tmp", 'wt', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(ARCHIVE_COLUMNS)
+            for row in day_rows:
+                writer.writerow([getattr(row, column) for column in ARCHIVE_COLUMNS])
+        paths.append(path)
+    return paths
+
+def _discard(paths):
+    for path in paths:
+        try:
+            os.remove(f"{path}.tmp")
+        except OSError:
+            pass
+
+def _publish(paths):
+    for path in paths:
+        os.replace(f"{path}.tmp", path)
+
+def recover_pending(engine):
+    """Settle archive files left by a pass that died between writing and renaming them.
+
+    A batch's DELETE is atomic, so if its first row is gone the batch committed
+    and the file is published; otherwise the rows are still hot and it is dropped.
+    """
+    pending = glob.glob(os.path.join(config.ARCHIVE_DIR, 'locations', '*', '*.csv.gz.tmp'))
+    for tmp_path in pending:
+        path = tmp_path[:-len('.tmp')]
+        first_id = int(os.path.basename(path).split('-', 1)[0])
+        with engine.connect() as conn:
+            committed = conn.execute(select(Location.id).where(Location.id == first_id)).first() is None
+        if committed:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+    return len(pending)
+
+def archive_batch(engine, cutoff, batch_size):
+    """Archive up to ``batch_size`` search rows older than ``cutoff``. Returns rows moved."""
+    paths = []
+    try:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(*(getattr(Location, column) for column in ARCHIVE_COLUMNS))
+                .where(Location.timestamp < cutoff, Location.query.isnot(None))
+                .order_by(Location.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return 0
+            paths = _write_archive(rows)
+            counts = Counter((row.timestamp.date(), row.user_id) for row in rows)
+            for (day, user_id), searches in counts.items():
+                upsert_add(conn, LocationDailyStat, {'day': day, 'user_id': user_id}, 'searches', searches)
+            conn.execute(delete(Location).where(Location.id.in_([row.id for row in rows])))
+    except Exception:
+        # The rows are still hot; the next pass archives them again
+        _discard(paths)
+        raise
+    _publish(paths)
+    return len(rows)
+
+def run_retention(engine=None, days=None, batch_size=None):
+    """Move all search history older than ``days`` to the archive, batch by batch."""
+    from bot.database import get_engine
+    engine = engine or get_engine()
+    days = config.RETENTION_DAYS if days is None else days
+    batch_size = batch_size or config.RETENTION_BATCH_SIZE
+    ensure_indexes(engine)
+    recover_pending(engine)
+    cutoff = dt.datetime.utcnow() - dt.timedelta(days=days)
+    total = 0
+    while True:
+        moved = archive_batch(engine, cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            break
+    if total:
+        logging.info(f"Archived {total} location search rows older than {cutoff:%Y-%m-%d}")
+    return total
+
+def archived_searches(session, user_id=None, since=None):
+    """Number of archived searches, optionally for one user and/or since a date."""
+    query = session.query(func.coalesce(func.sum(LocationDailyStat.searches), 0))
+    if user_id is not None:
+        query = query.filter(LocationDailyStat.user_id == user_id)
+    if since is not None:
+        query = query.filter(LocationDailyStat.day >= since)
+    return query.scalar()
+
+def total_searches(session):
+    """All searches ever logged: hot search rows plus archived daily counts."""
+    return session.query(Location).filter(Location.query.isnot(None)).count() + archived_searches(session)
+
+def _worker_loop():
+    while True:
+        try:
+            run_retention()
+        except Exception as e:
+            logging.error(f"Retention job failed: {e}")
+        time.sleep(config.RETENTION_INTERVAL)
+
+def start_worker():
+    """Start the background retention job (once per process; run it in one process only)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, name='retention', daemon=True)
+            _worker.start()
+    return _worker
+
+if __name__ == '__main__':
+    print(f"Archived {run_retention()} rows.")
+    sys.exit(0)
@@ -0,0 +1,107 @@
+# rollups.py
+"""Incremental hour/day x sentiment rollups of analysis results.
+
+Rollups are updated in the same transaction that inserts analysis results,
+so the analytics page reads a table whose size depends on the date range,
+not on the number of raw results.
+
+Rebuild from the raw table (e.g. after first deploying rollups):
+    python -m bot.rollups --rebuild
+"""
+import argparse
+from collections import Counter
+from sqlalchemy import delete, select, update, insert
+from admin.models import AnalysisResult, SentimentRollup
+
+GRANULARITIES = ('hour', 'day')
+# Sentiment label stored for results without one
+UNKNOWN_SENTIMENT = 'unknown'
+
+def bucket_start(timestamp, granularity):
+    """Truncate ``timestamp`` to the start of its hour or day."""
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def upsert_add(conn, model, keys, column, amount):
+    """Add ``amount`` to ``column`` of the row identified by ``keys``, inserting it if missing."""
+    dialect = conn.dialect.name
+    counter = getattr(model, column)
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(model).values(**keys, **{column: amount})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: counter + getattr(stmt.excluded, column)},
+        )
+        conn.execute(stmt)
+        return
+    result = conn.execute(
+        update(model)
+        .where(*(getattr(model, name) == value for name, value in keys.items()))
+        .values(**{column: counter + amount})
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(model).values(**keys, **{column: amount}))
+
+def record(conn, results):
+    """Add ``results`` (dicts with 'sentiment' and 'created_at') to the rollups on ``conn``."""
+    counts = Counter()
+    for row in results:
+        sentiment = row.get('sentiment') or UNKNOWN_SENTIMENT
+        for granularity in GRANULARITIES:
+            counts[(granularity, bucket_start(row['created_at'], granularity), sentiment)] += 1
+    for (granularity, start, sentiment), amount in counts.items():
+        keys = {'granularity': granularity, 'bucket_start': start, 'sentiment': sentiment}
+        upsert_add(conn, SentimentRollup, keys, 'count', amount)
+
+def rebuild(engine):
+    """Recompute all rollups from the raw analysis_results table."""
+    with engine.begin() as conn:
+        conn.execute(delete(SentimentRollup))
+        rows = conn.execute(select(AnalysisResult.sentiment, AnalysisResult.created_at)
+                            .where(AnalysisResult.created_at.isnot(None)))
+        batch = []
+        for sentiment, created_at in rows:
+            batch.append({'sentiment': sentiment, 'created_at': created_at})
+            if len(batch) >= 10000:
+                record(conn, batch)
+                batch = []
+        record(conn, batch)
+
+def query(session, start, end, granularity='day'):
+    """Return (totals, series) for buckets in [start, end).
+
+    ``totals`` is a list of (sentiment, count); ``series`` is a list of
+    (bucket_start, {sentiment: count}) in time order.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    rows = session.query(
+        SentimentRollup.bucket_start, SentimentRollup.sentiment, SentimentRollup.count
+    ).filter(
+        SentimentRollup.granularity == granularity,
+        SentimentRollup.bucket_start >= bucket_start(start, granularity),
+        SentimentRollup.bucket_start < end
+    ).order_by(SentimentRollup.bucket_start).all()
+    totals = Counter()
+    series = {}
+    for start_at, sentiment, count in rows:
+        totals[sentiment] += count
+        series.setdefault(start_at, {})[sentiment] = count
+    return sorted(totals.items()), sorted(series.items())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain sentiment rollups.")
+    parser.add_argument('--rebuild', action='store_true', help="recompute rollups from analysis_results")
+    args = parser.parse_args(argv)
+    if args.rebuild:
+        from bot.database import get_engine
+        rebuild(get_engine())
+        print("Sentiment rollups rebuilt.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+# supervisor.py
+"""Multi-process worker mode for the bot.
+
+The supervisor long-polls Telegram and routes each update to one of N worker
+processes by user id, so a user's conversation state (USER_STATE), rate-limit
+timestamps and caches stay in a single process. Workers are restarted if they
+crash, report metrics back to the supervisor, and drain their queues on
+shutdown.
+
+Run with:
+    python -m bot.supervisor --workers 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+# Seconds between metric reports from each worker
+METRICS_INTERVAL = 5.0
+
+def _context():
+    # Never fork the supervisor itself: by now it runs threads (retention,
+    # place index loader, Flask, auth refresher) whose locks a forked child
+    # would inherit mid-use. The fork server is started clean and preloads
+    # the heavy imports so worker (re)starts stay cheap.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['bot.bootstrap', 'sqlalchemy.orm'])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+def update_user_id(update):
+    """Return the user id of a raw update dict (0 when it has none)."""
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        sender = value.get('from') or value.get('user') or value.get('chat') or {}
+        if isinstance(sender, dict) and sender.get('id') is not None:
+            return sender['id']
+    return 0
+
+def _worker_main(index, inbox, metrics_out, initializer=None, initargs=()):
+    """Worker process: handle routed updates until a None sentinel arrives."""
+    from telebot.types import Update
+    from bot.bootstrap import bootstrap
+    from bot import bot as telegram_bot
+    if initializer is not None:
+        initializer(*initargs)
+    # The supervisor already created the schema and admin user
+    bootstrap(create_schema=False, init_admin=False)
+    telegram_bot.threaded = False
+    metrics = {'worker': index, 'pid': os.getpid(), 'processed': 0, 'errors': 0, 'busy_seconds': 0.0}
+    next_report = time.monotonic() + METRICS_INTERVAL
+    while True:
+        try:
+            raw = inbox.get(timeout=1)
+        except queue.Empty:
+            raw = False
+        if raw is None:
+            break
+        if raw is not False:
+            start = time.perf_counter()
+            try:
+                telegram_bot.process_new_updates([Update.de_json(raw)])
+                metrics['processed'] += 1
+            except Exception as e:
+                metrics['errors'] += 1
+                logging.error(f"Worker {index} failed to handle update {raw.get('update_id')}: {e}")
+            metrics['busy_seconds'] += time.perf_counter() - start
+        if time.monotonic() >= next_report:
+            metrics_out.put(dict(metrics))
+            next_report = time.monotonic() + METRICS_INTERVAL
+    metrics_out.put(dict(metrics, exited=True))
+
+class Supervisor:
+    """Starts ``workers`` processes and routes updates to them by user id.
+
+    Workers start from a fresh interpreter and only see the environment, so
+    in-process setup (e.g. benchmark stubs) goes in ``initializer``, a
+    picklable callable run with ``initargs`` in each worker before bootstrap.
+    """
+
+    def __init__(self, workers=None, initializer=None, initargs=()):
+        self.ctx = _context()
+        self.size = workers or os.cpu_count() or 1
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.inboxes = [self.ctx.Queue() for _ in range(self.size)]
+        self.metrics_in = self.ctx.Queue()
+        self.processes = [None] * self.size
+        self.restarts = [0] * self.size
+        self.dispatched = [0] * self.size
+        self.worker_metrics = {}
+        self.stopping = threading.Event()
+
+    def _spawn(self, index):
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(index, self.inboxes[index], self.metrics_in, self.initializer, self.initargs),
+            name=f"bot-worker-{index}", daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        """Bootstrap the database once, then start the workers."""
+        from bot.bootstrap import bootstrap
+        from bot import database
+        bootstrap(load_handlers=False)
+        # The supervisor doesn't query again; each worker opens its own connections
+        database.dispose_engines()
+        for index in range(self.size):
+            self._spawn(index)
+        logging.info(f"Supervisor started {self.size} workers")
+        return self
+
+    def dispatch(self, update):
+        """Route a raw update dict to its user's worker."""
+        index = update_user_id(update) % self.size
+        self.inboxes[index].put(update)
+        self.dispatched[index] += 1
+
+    def check_workers(self):
+        """Collect metrics and restart any worker that died unexpectedly."""
+        self.collect_metrics()
+        if self.stopping.is_set():
+            return
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                self.restarts[index] += 1
+                logging.error(f"Worker {index} exited with code {process.exitcode}; restarting")
+                self._spawn(index)
+
+    def collect_metrics(self):
+        while True:
+            try:
+                snapshot = self.metrics_in.get_nowait()
+            except queue.Empty:
+                break
+            self.worker_metrics[snapshot['worker']] = snapshot
+
+    def metrics(self):
+        """Return per-worker metrics merged with supervisor-side counters."""
+        self.collect_metrics()
+        report = []
+        for index in range(self.size):
+            row = dict(self.worker_metrics.get(index, {'worker': index}))
+            row['dispatched'] = self.dispatched[index]
+            row['restarts'] = self.restarts[index]
+            try:
+                row['queued'] = self.inboxes[index].qsize()
+            except NotImplementedError:  # macOS
+                row['queued'] = None
+            report.append(row)
+        return report
+
+    def format_metrics(self):
+        lines = []
+        for row in self.metrics():
+            lines.append(
+                f"worker {row['worker']}: dispatched {row['dispatched']}, processed {row.get('processed', 0)}, "
+                f"errors {row.get('errors', 0)}, busy {row.get('busy_seconds', 0.0):.1f}s, "
+                f"queued {row['queued']}, restarts {row['restarts']}"
+            )
+        return "\n".join(lines)
+
+    def poll_forever(self, timeout=30):
+        """Long-poll Telegram and dispatch updates until shutdown() is called."""
+        from telebot import apihelper
+        from bot import config
+        offset = None
+        next_metrics_log = time.monotonic() + 60
+        while not self.stopping.is_set():
+            try:
+                updates = apihelper.get_updates(config.BOT_TOKEN, offset=offset, timeout=timeout + 5,
+                                                long_polling_timeout=timeout)
+            except Exception as e:
+                logging.error(f"Polling failed: {e}")
+                time.sleep(3)
+                updates = []
+            for update in updates:
+                offset = update['update_id'] + 1
+                self.dispatch(update)
+            self.check_workers()
+            if time.monotonic() >= next_metrics_log:
+                logging.info(f"Worker metrics:\n{self.format_metrics()}")
+                next_metrics_log = time.monotonic() + 60
+
+    def shutdown(self, drain=True, timeout=30):
+        """Stop polling and stop the workers, letting them finish queued updates if ``drain``."""
+        self.stopping.set()
+        if drain:
+            for inbox in self.inboxes:
+                inbox.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is None:
+                continue
+            if drain:
+                process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+        self.collect_metrics()
+
+    def install_signal_handlers(self):
+        def handle(signum, frame):
+            logging.info(f"Received signal {signum}, draining workers")
+            self.stopping.set()
+        signal.signal(signal.SIGTERM, handle)
+        signal.signal(signal.SIGINT, handle)
+
+def run(workers=None, install_signals=True):
+    """Run the supervisor until interrupted, then drain and stop the workers."""
+    supervisor = Supervisor(workers).start()
+    if install_signals:
+        supervisor.install_signal_handlers()
+    try:
+        supervisor.poll_forever()
+    finally:
+        supervisor.shutdown(drain=True)
+        logging.info(f"Final worker metrics:\n{supervisor.format_metrics()}")
+    return supervisor
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the bot with a pool of worker processes.")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(processName)s: %(message)s')
+    # Background jobs run once, in the supervisor
+    from bot import retention
+    retention.start_worker()
+    run(args.workers)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
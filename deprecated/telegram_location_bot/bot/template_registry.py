@@ -0,0 +1,176 @@
+# template_registry.py
+"""Compiled reply templates with throttled, mtime-based hot reload."""
+import logging
+import os
+import string
+import threading
+import time
+from bot import config
+
+_formatter = string.Formatter()
+
+
+class TemplateError(ValueError):
+    """Raised when a template cannot be parsed or uses unknown placeholders."""
+
+
+class CompiledTemplate:
+    """A template pre-parsed into literal text and placeholder parts.
+
+    A ``raw`` template has no placeholders and is served exactly as written,
+    braces included.
+    """
+
+    def __init__(self, text, placeholders=(), raw=False):
+        self.text = text
+        self.fields = set()
+        if raw:
+            self._parts = ((text, None, None),)
+            return
+        parts = []
+        try:
+            parsed = list(_formatter.parse(text))
+        except ValueError as e:
+            raise TemplateError(str(e))
+        for literal, field, spec, conversion in parsed:
+            if literal:
+                parts.append((literal, None, None))
+            if field is None:
+                continue
+            if field not in placeholders:
+                allowed = ", ".join(sorted(placeholders)) or "none"
+                raise TemplateError(f"Unknown placeholder {{{field}}} (allowed: {allowed})")
+            if conversion:
+                raise TemplateError(f"Conversions are not supported: {{{field}!{conversion}}}")
+            self.fields.add(field)
+            parts.append((None, field, spec))
+        self._parts = tuple(parts)
+
+    def render(self, **values):
+        """Render the template; missing values render as empty strings."""
+        out = []
+        for literal, field, spec in self._parts:
+            if field is None:
+                out.append(literal)
+            else:
+                value = values.get(field, "")
+                out.append(format(value, spec) if spec else str(value))
+        return "".join(out)
+
+
+class _Entry:
+    __slots__ = ("name", "path", "placeholders", "default", "raw", "compiled", "mtime")
+
+    def __init__(self, name, path, placeholders, default, raw=False):
+        self.name = name
+        self.path = path
+        self.placeholders = frozenset(placeholders)
+        self.default = default
+        self.raw = raw
+        self.compiled = None
+        self.mtime = None
+
+
+class TemplateRegistry:
+    """Holds compiled reply templates and picks up file edits without a restart.
+
+    Template files are read once at registration. Afterwards their mtimes are
+    checked at most every ``check_interval`` seconds, so the per-message path
+    does no disk I/O.
+    """
+
+    def __init__(self, check_interval=None):
+        self.check_interval = config.TEMPLATE_CHECK_INTERVAL if check_interval is None else check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+
+    def register(self, name, path, placeholders=(), default="", raw=False):
+        """Register a template file; ``default`` is used while the file is missing or invalid.
+
+        ``raw`` templates are not parsed for placeholders (see CompiledTemplate).
+        """
+        entry = _Entry(name, path, placeholders, default, raw)
+        # Validate the built-in default up front so a bad default fails loudly
+        entry.compiled = self._compile(entry, default)
+        self._load(entry)
+        with self._lock:
+            self._entries[name] = entry
+        return entry.compiled
+
+    @staticmethod
+    def _compile(entry, text):
+        return CompiledTemplate(text, entry.placeholders, raw=entry.raw)
+
+    def _load(self, entry):
+        try:
+            mtime = os.stat(entry.path).st_mtime
+        except OSError:
+            # File removed (or never created): fall back to the default
+            if entry.mtime is not None:
+                entry.compiled = self._compile(entry, entry.default)
+            entry.mtime = None
+            return
+        if mtime == entry.mtime:
+            return
+        entry.mtime = mtime
+        try:
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                entry.compiled = self._compile(entry, f.read())
+            logging.info(f"Loaded reply template '{entry.name}' from {entry.path}")
+        except (OSError, TemplateError) as e:
+            # Keep serving the previous version rather than breaking replies
+            logging.error(f"Invalid reply template '{entry.name}' ({entry.path}): {e}")
+
+    def refresh(self, force=False):
+        """Reload templates whose files changed, at most once per check interval."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            for entry in self._entries.values():
+                self._load(entry)
+
+    def get(self, name):
+        self.refresh()
+        return self._entries[name].compiled
+
+    def render(self, name, **values):
+        return self.get(name).render(**values)
+
+    def render_many(self, name, rows, separator=""):
+        """Render a repeated section once per row and join the results."""
+        compiled = self.get(name)
+        return separator.join(compiled.render(**row) for row in rows)
+
+    def names(self):
+        return sorted(self._entries)
+
+    def describe(self, name):
+        """Return (source text, allowed placeholders, path) for the admin panel."""
+        self.refresh()
+        entry = self._entries[name]
+        return entry.compiled.text, sorted(entry.placeholders), entry.path
+
+    def save(self, name, text):
+        """Validate and write a template, then activate it immediately."""
+        entry = self._entries[name]
+        compiled = self._compile(entry, text)  # raises TemplateError
+        directory = os.path.dirname(entry.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{entry.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, entry.path)
+        with self._lock:
+            entry.compiled = compiled
+            entry.mtime = os.stat(entry.path).st_mtime
+        return compiled
+
+
+# Shared registry used by the bot handlers and the admin panel
+registry = TemplateRegistry()
@@ -0,0 +1,244 @@
+# user_directory.py
+"""Indexed user lookups, search and bulk actions for the admin panel.
+
+Case-insensitive lookups and prefix search go through functional indexes on
+``lower(username)``, ``lower(first_name)`` and ``lower(last_name)`` of the
+users table (text_pattern_ops on PostgreSQL, so LIKE 'prefix%' can use
+them), created like retention.HOT_INDEX. The indexes always match the users
+table, so a renamed user can never be found under an old name. The
+user_activity table records when the bot last saw each user. Listings use
+keyset pagination on users.id, and bulk actions update users in fixed-size
+batches.
+
+Indexes are created with the schema (bot.bootstrap); to create them by hand:
+    python -m bot.user_directory --create-indexes
+"""
+import argparse
+import datetime as dt
+import threading
+import time
+from sqlalchemy import Index, and_, func, insert, or_, update
+from sqlalchemy.schema import CreateIndex
+from bot import config
+from admin.models import User, UserActivity
+
+# Bulk actions: column values applied to users, and whether affected users lose access
+ACTIONS = {
+    'deactivate': ({'is_active': False}, True),
+    'activate': ({'is_active': True}, False),
+    'demote': ({'is_admin': False}, True),
+}
+
+# Functional indexes on the externally managed users table
+USER_INDEXES = (
+    Index('ix_users_lower_username', func.lower(User.username).label('username_lower'),
+          postgresql_ops={'username_lower': 'text_pattern_ops'}),
+    Index('ix_users_lower_first_name', func.lower(User.first_name).label('first_name_lower'),
+          postgresql_ops={'first_name_lower': 'text_pattern_ops'}),
+    Index('ix_users_lower_last_name', func.lower(User.last_name).label('last_name_lower'),
+          postgresql_ops={'last_name_lower': 'text_pattern_ops'}),
+)
+
+# user id -> monotonic time its last-seen time was written by this process
+_last_seen_written = {}
+_seen_lock = threading.Lock()
+
+
+def ensure_indexes(engine):
+    # Expression indexes can't be reflected, so checkfirst would miss them; let the database check
+    with engine.begin() as conn:
+        for index in USER_INDEXES:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def normalize(value):
+    """Search key for a username or name: stripped, without '@', lower-cased, None when empty."""
+    value = (value or '').strip().lstrip('@').lower()
+    return value or None
+
+
+def upsert_last_seen(conn, user_id, seen_at):
+    """Record ``seen_at`` as the user's last-seen time on ``conn``."""
+    dialect = conn.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(UserActivity).values(user_id=user_id, last_seen_at=seen_at)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id'], set_={'last_seen_at': stmt.excluded.last_seen_at}
+        ))
+        return
+    result = conn.execute(
+        update(UserActivity).where(UserActivity.user_id == user_id).values(last_seen_at=seen_at)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(UserActivity).values(user_id=user_id, last_seen_at=seen_at))
+
+
+def seen_due(user_id, force=False):
+    """Return True if this process should write the user's last-seen time now."""
+    now = time.monotonic()
+    with _seen_lock:
+        last = _last_seen_written.get(user_id)
+        if not force and last is not None and now - last < config.USER_SEEN_INTERVAL:
+            return False
+        _last_seen_written[user_id] = now
+        return True
+
+
+def touch(session, user, force=False):
+    """Record that ``user`` was seen, inside ``session`` (caller commits). Returns True if written.
+
+    Writes at most once per USER_SEEN_INTERVAL per user unless ``force`` (new users).
+    """
+    if not seen_due(user.id, force):
+        return False
+    upsert_last_seen(session.connection(), user.id, dt.datetime.utcnow())
+    return True
+
+
+def find_by_username(session, username):
+    """Case-insensitive username lookup (served by the lower(username) index)."""
+    key = normalize(username)
+    if not key:
+        return None
+    return session.query(User).filter(func.lower(User.username) == key).first()
+
+
+def _prefix(column, prefix, dialect):
+    expression = func.lower(column)
+    if dialect == 'postgresql':
+        # Served by the text_pattern_ops index
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return expression.like(f"{escaped}%", escape='\\')
+    # SQLite's LIKE is case-insensitive and skips plain indexes; a range on the indexed expression doesn't
+    return and_(expression >= prefix, expression < prefix + '\U0010ffff')
+
+
+def apply_filters(query, dialect, text=None, is_admin=None, is_active=None, seen_since=None, never_seen=False):
+    """Add search filters to a query over User outer-joined with UserActivity."""
+    text = normalize(text)
+    if text:
+        if text.isdigit():
+            query = query.filter(or_(User.telegram_id == int(text), User.id == int(text),
+                                     _prefix(User.username, text, dialect)))
+        else:
+            words = text.split()
+            if len(words) > 1:
+                # "john sm" -> first name "john..." and last name "sm..."
+                query = query.filter(_prefix(User.first_name, words[0], dialect),
+                                     _prefix(User.last_name, " ".join(words[1:]), dialect))
+            else:
+                query = query.filter(or_(
+                    _prefix(User.username, text, dialect),
+                    _prefix(User.first_name, text, dialect),
+                    _prefix(User.last_name, text, dialect),
+                ))
+    if is_admin is not None:
+        query = query.filter(User.is_admin == is_admin)
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    if never_seen:
+        query = query.filter(UserActivity.last_seen_at.is_(None))
+    elif seen_since is not None:
+        query = query.filter(UserActivity.last_seen_at >= seen_since)
+    return query
+
+
+def _directory_query(session, *columns):
+    return session.query(*columns).outerjoin(UserActivity, UserActivity.user_id == User.id)
+
+
+def search(session, after_id=None, limit=None, **filters):
+    """One page of users matching ``filters`` (see apply_filters), ordered by id.
+
+    Returns (rows, next_after_id): rows are (User, last_seen_at) tuples, and
+    next_after_id is the cursor for the next page (None on the last page).
+    """
+    limit = limit or config.USER_PAGE_SIZE
+    query = apply_filters(_directory_query(session, User, UserActivity.last_seen_at),
+                          session.get_bind().dialect.name, **filters)
+    if after_id:
+        query = query.filter(User.id > after_id)
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    next_after_id = rows[limit - 1][0].id if len(rows) > limit else None
+    return rows[:limit], next_after_id
+
+
+def iter_matching_ids(session, batch_size=None, **filters):
+    """Yield lists of matching user ids, one keyset page at a time."""
+    batch_size = batch_size or config.USER_BULK_BATCH_SIZE
+    dialect = session.get_bind().dialect.name
+    after_id = 0
+    while True:
+        query = apply_filters(_directory_query(session, User.id), dialect, **filters)
+        ids = [row[0] for row in query.filter(User.id > after_id).order_by(User.id).limit(batch_size)]
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+
+def apply_action(action, user_ids, exclude_ids=()):
+    """Apply a bulk ``action`` to ``user_ids`` in batched UPDATEs. Returns the number of users changed.
+
+    Only rows whose value actually changes are updated. Only admins hold admin
+    panel sessions and sit in the admin cache, so only affected admins have
+    their sessions revoked, and the cache is invalidated once if any changed.
+    """
+    from bot import auth_versions, rbac
+    from bot.database import SessionLocal
+    values, revokes_access = ACTIONS[action]
+    ids = sorted(set(user_ids) - set(exclude_ids))
+    changed = 0
+    admins_changed = False
+    for start in range(0, len(ids), config.USER_BULK_BATCH_SIZE):
+        batch = ids[start:start + config.USER_BULK_BATCH_SIZE]
+        session = SessionLocal()
+        try:
+            differs = [or_(getattr(User, name) != value, getattr(User, name).is_(None))
+                       for name, value in values.items()]
+            targets = session.query(User.id, User.is_admin).filter(User.id.in_(batch), or_(*differs)).all()
+            if not targets:
+                continue
+            session.execute(update(User).where(User.id.in_([row.id for row in targets])).values(**values),
+                            execution_options={'synchronize_session': False})
+            session.commit()
+        finally:
+            session.close()
+        admin_ids = [row.id for row in targets if row.is_admin]
+        if revokes_access and admin_ids:
+            auth_versions.bump_users(admin_ids)
+        admins_changed = admins_changed or bool(admin_ids)
+        changed += len(targets)
+    if admins_changed:
+        rbac.invalidate_admin_cache()
+    return changed
+
+
+def apply_action_to_matching(action, exclude_ids=(), **filters):
+    """Apply a bulk ``action`` to every user matching ``filters``, batch by batch."""
+    from bot.database import ReadSessionLocal
+    session = ReadSessionLocal()
+    try:
+        ids = [user_id for batch in iter_matching_ids(session, **filters) for user_id in batch]
+    finally:
+        session.close()
+    # One call, so the admin cache is invalidated once for the whole action
+    return apply_action(action, ids, exclude_ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the admin user search indexes.")
+    parser.add_argument('--create-indexes', action='store_true',
+                        help="create the lower(name) indexes on the users table")
+    args = parser.parse_args(argv)
+    if args.create_indexes:
+        from bot.database import get_engine
+        ensure_indexes(get_engine())
+        print("User search indexes are in place.")
+
+if __name__ == '__main__':
+    main()
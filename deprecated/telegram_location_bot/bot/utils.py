@@ -11,6 +11,14 @@ def safe_reply(bot, message: Message, text: str, **kwargs):
         logging.warning(f"Failed to reply to user {getattr(message.from_user, 'id', '?')}: {e}")
         return None
 
+async def async_safe_reply(bot, message: Message, text: str, **kwargs):
+    """safe_reply() for the AsyncTeleBot used by the asyncio runtime."""
+    try:
+        return await bot.reply_to(message, text, **kwargs)
+    except Exception as e:
+        logging.warning(f"Failed to reply to user {getattr(message.from_user, 'id', '?')}: {e}")
+        return None
+
 def format_user(user):
     """Return a display name for the user (prefers username, else full name, else telegram id)."""
     if hasattr(user, 'username') and user.username:
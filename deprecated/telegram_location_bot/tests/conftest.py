@@ -0,0 +1,54 @@
+"""Shared fixtures: a scratch SQLite database for tests that import the bot modules."""
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# bot.config reads the environment once, at import time, so point it at scratch files first
+SCRATCH_DIR = tempfile.mkdtemp(prefix='bot-tests-')
+os.environ.setdefault('BOT_TOKEN', '123456:TEST')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bot.db')}"
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+
+@pytest.fixture
+def db():
+    """Recreate every table and return the bot.database module."""
+    from bot import database
+    from admin.models import Base
+    Base.metadata.drop_all(bind=database.get_engine())
+    database.create_schema()
+    return database
+
+
+@pytest.fixture
+def make_user(db):
+    """Insert a user and return its id."""
+    def make(telegram_id, username=None, is_admin=False, is_active=True, **fields):
+        session = db.SessionLocal()
+        try:
+            user = db.models.User(telegram_id=telegram_id, username=username,
+                                  is_admin=is_admin, is_active=is_active, **fields)
+            session.add(user)
+            session.commit()
+            return user.id
+        finally:
+            session.close()
+    return make
+
+
+@pytest.fixture
+def make_message():
+    """Build a minimal stand-in for a telebot Message sent by ``from_id``."""
+    def make(text, from_id):
+        return types.SimpleNamespace(
+            text=text,
+            from_user=types.SimpleNamespace(id=from_id),
+            chat=types.SimpleNamespace(id=from_id),
+        )
+    return make
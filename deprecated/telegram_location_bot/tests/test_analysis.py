@@ -0,0 +1,161 @@
+"""Batched text analysis pipeline (bot.analysis) against the local Loveable.dev stub."""
+import queue
+import time
+import types
+
+import pytest
+
+from benchmarks.stubs import AnalysisStub
+
+
+@pytest.fixture(scope='module')
+def server():
+    stub = AnalysisStub().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def stub(server):
+    server.requests, server.fail_next, server.fail_status = 0, 0, 503
+    return server
+
+
+@pytest.fixture
+def analysis(db, stub, monkeypatch):
+    """bot.analysis pointed at the stub, with an empty cache, fresh counters and no backoff sleeps."""
+    from bot import analysis, config
+    monkeypatch.setenv('LOVEABLE_API_KEY', 'test')
+    monkeypatch.setattr(config, 'LOVEABLE_API_URL', stub.url + '/analyze')
+    monkeypatch.setattr(config, 'ANALYSIS_MAX_RETRIES', 3)
+    monkeypatch.setattr(analysis, '_cache', analysis._ResultCache(100))
+    monkeypatch.setattr(analysis, '_stats', dict.fromkeys(analysis._stats, 0))
+    monkeypatch.setattr(analysis, 'time', types.SimpleNamespace(sleep=lambda seconds: None, monotonic=time.monotonic))
+    return analysis
+
+
+def saved_rows(db):
+    session = db.SessionLocal()
+    try:
+        return session.query(db.models.AnalysisResult.user_id, db.models.AnalysisResult.text).all()
+    finally:
+        session.close()
+
+
+def test_next_batch_collects_up_to_batch_size(analysis, monkeypatch):
+    from bot import config
+    monkeypatch.setattr(analysis, '_queue', queue.Queue())
+    monkeypatch.setattr(config, 'ANALYSIS_BATCH_SIZE', 3)
+    monkeypatch.setattr(config, 'ANALYSIS_BATCH_WAIT', 0.05)
+    for i in range(5):
+        analysis._queue.put((i, f"text {i}"))
+    assert [item[0] for item in analysis._next_batch()] == [0, 1, 2]
+    assert [item[0] for item in analysis._next_batch()] == [3, 4]
+
+
+def test_batch_is_saved_in_one_insert(analysis, stub, db, monkeypatch):
+    inserts = []
+    save = db.save_analysis_results
+    monkeypatch.setattr(db, 'save_analysis_results', lambda rows: inserts.append(len(rows)) or save(rows))
+    saved = analysis.process_batch([(1, "good morning"), (2, "see you later"), (3, "thanks a lot")])
+    assert saved == 3
+    assert inserts == [3]
+    assert sorted(saved_rows(db)) == [(1, "good morning"), (2, "see you later"), (3, "thanks a lot")]
+    assert stub.requests == 3
+
+
+def test_repeated_texts_are_analyzed_once(analysis, stub, db):
+    assert analysis.process_batch([(1, "hello"), (2, "Hello "), (3, "bye")]) == 3
+    assert stub.requests == 2
+    assert len(saved_rows(db)) == 3
+    assert analysis.stats()['cache_hits'] == 1
+
+
+def test_cache_answers_texts_seen_before(analysis, stub):
+    analysis.process_batch([(1, "hello")])
+    analysis.process_batch([(2, "hello")])
+    assert stub.requests == 1
+    assert analysis.stats()['cache_hits'] == 1
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_retries_rate_limits_and_server_errors(analysis, stub, db, status):
+    stub.fail_next, stub.fail_status = 2, status
+    assert analysis.process_batch([(1, "hello")]) == 1
+    assert stub.requests == 3
+    assert len(saved_rows(db)) == 1
+
+
+@pytest.mark.parametrize('status', [400, 401, 404])
+def test_does_not_retry_other_client_errors(analysis, stub, db, status):
+    stub.fail_next, stub.fail_status = 1, status
+    assert analysis.process_batch([(1, "hello")]) == 0
+    assert stub.requests == 1
+    assert analysis.stats()['failed'] == 1
+    assert saved_rows(db) == []
+
+
+def test_gives_up_after_max_retries(analysis, stub):
+    stub.fail_next = 10
+    assert analysis.process_batch([(1, "hello")]) == 0
+    assert stub.requests == 3
+
+
+def test_zero_retries_still_makes_one_attempt(analysis, stub, monkeypatch):
+    from bot import config
+    monkeypatch.setattr(config, 'ANALYSIS_MAX_RETRIES', 0)
+    assert analysis.process_batch([(1, "hello")]) == 1
+    assert stub.requests == 1
+
+
+def test_batch_updates_sentiment_rollups(analysis, db):
+    import datetime as dt
+    from bot import rollups
+    analysis.process_batch([(1, "a"), (2, "bb"), (3, "ccc"), (4, "dd"), (5, "a")])
+    now = dt.datetime.utcnow()
+    window = (now - dt.timedelta(days=1), now + dt.timedelta(days=1))
+    session = db.SessionLocal()
+    try:
+        for granularity in rollups.GRANULARITIES:
+            totals, _ = rollups.query(session, *window, granularity=granularity)
+            # The stub's sentiment depends on the text length
+            assert totals == [('negative', 2), ('neutral', 2), ('positive', 1)]
+        rollups.rebuild(db.get_engine())
+        assert rollups.query(session, *window)[0] == totals
+    finally:
+        session.close()
+
+
+def run_async_batch(analysis, batch):
+    import asyncio
+    from bot import async_database, async_http
+
+    async def run():
+        try:
+            return await analysis.process_batch_async(batch)
+        finally:
+            await async_http.close()
+            await async_database.dispose()
+
+    return asyncio.run(run())
+
+
+def test_async_batch_analyzes_repeated_texts_once(analysis, stub, db):
+    assert run_async_batch(analysis, [(1, "hello"), (2, "Hello "), (3, "bye")]) == 3
+    assert stub.requests == 2
+    assert len(saved_rows(db)) == 3
+
+
+@pytest.mark.parametrize('retries, status, requests', [(3, 503, 3), (3, 400, 1), (0, 503, 1)])
+def test_async_retries(analysis, stub, monkeypatch, retries, status, requests):
+    from bot import config
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(config, 'ANALYSIS_MAX_RETRIES', retries)
+    monkeypatch.setattr(analysis.asyncio, 'sleep', no_sleep)
+    stub.fail_next, stub.fail_status = 2, status
+    saved = run_async_batch(analysis, [(1, "hello")])
+    assert stub.requests == requests
+    assert saved == (1 if status >= 500 and retries > 2 else 0)
@@ -0,0 +1,85 @@
+"""Admin panel sessions are revoked through bot.auth_versions after a demotion."""
+import types
+
+import pytest
+from flask import Blueprint, Flask
+
+from bot.auth import login_required, start_admin_session
+
+ADMIN_ID = 1001
+OTHER_ADMIN_ID = 3003
+
+
+@pytest.fixture
+def auth_versions(db, monkeypatch):
+    from bot import auth_versions
+    monkeypatch.setattr(auth_versions, '_user_versions', {})
+    monkeypatch.setattr(auth_versions, '_users_version', None)
+    return auth_versions
+
+
+@pytest.fixture
+def client(auth_versions):
+    """A Flask client for a panel page behind login_required; /enter/<id> logs a user in."""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    bp = Blueprint('admin_bp', __name__)
+
+    @bp.route('/login')
+    def login():
+        return 'login'
+
+    @bp.route('/enter/<int:user_id>')
+    def enter(user_id):
+        start_admin_session(types.SimpleNamespace(id=user_id))
+        return 'ok'
+
+    @bp.route('/panel')
+    @login_required
+    def panel():
+        return 'panel'
+
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def test_session_is_valid_until_the_user_is_bumped(client, make_user, auth_versions):
+    user_id = make_user(ADMIN_ID, username='boss', is_admin=True)
+    client.get(f"/enter/{user_id}")
+    assert client.get('/panel').status_code == 200
+    auth_versions.bump_user(user_id)
+    response = client.get('/panel')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/login')
+    # The session was cleared, so logging in again is required
+    assert client.get('/panel').status_code == 302
+
+
+def test_demote_command_revokes_panel_session(client, make_user, make_message, monkeypatch):
+    from bot import admin_commands, rate_limit, rbac
+    make_user(ADMIN_ID, username='boss', is_admin=True)
+    target_id = make_user(OTHER_ADMIN_ID, username='deputy', is_admin=True)
+    client.get(f"/enter/{target_id}")
+    assert client.get('/panel').status_code == 200
+    monkeypatch.setattr(admin_commands, 'safe_reply', lambda *args, **kw: None)
+    monkeypatch.setattr(admin_commands.bot, 'send_message', lambda *args, **kw: None)
+    monkeypatch.setattr(rate_limit, '_last_time', {})
+    monkeypatch.setattr(rbac, '_admin_ids', None)
+    admin_commands.demote_command(make_message(f"/demote {OTHER_ADMIN_ID}", ADMIN_ID))
+    assert client.get('/panel').status_code == 302
+
+
+def test_bump_from_another_process_is_seen_after_reload(client, make_user, auth_versions, db):
+    user_id = make_user(ADMIN_ID, username='boss', is_admin=True)
+    client.get(f"/enter/{user_id}")
+    assert client.get('/panel').status_code == 200
+    # What bump_user() does in another process: only the table changes
+    session = db.SessionLocal()
+    try:
+        auth_versions.bump(session, f"{auth_versions.USER_PREFIX}{user_id}")
+        auth_versions.bump(session, auth_versions.USERS_KEY)
+        session.commit()
+    finally:
+        session.close()
+    auth_versions._reload()
+    assert client.get('/panel').status_code == 302
@@ -0,0 +1,67 @@
+"""Chunked, compressed SQLite backups (bot.backup): backup, verify, restore."""
+import hashlib
+import os
+import sqlite3
+
+import pytest
+
+from bot import backup
+
+
+@pytest.fixture
+def populated(db, make_user):
+    """A database with enough hard-to-compress rows to span several backup parts."""
+    user_id = make_user(1001, username='boss', is_admin=True)
+    session = db.SessionLocal()
+    try:
+        for i in range(500):
+            address = hashlib.sha256(str(i).encode()).hexdigest()
+            session.add(db.models.Location(user_id=user_id, latitude=str(50 + i / 1000),
+                                           longitude=str(-1 - i / 1000), address=address))
+        session.commit()
+    finally:
+        session.close()
+    return db
+
+
+def location_rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT id, user_id, latitude, longitude, address FROM locations ORDER BY id").fetchall()
+
+
+def source_path(db):
+    return db.get_engine().url.database
+
+
+def test_backup_verify_restore_round_trip(populated, tmp_path):
+    progress = []
+    manifest_path = backup.create_backup(progress=lambda done, total: progress.append((done, total)),
+                                         directory=str(tmp_path / 'backup'), part_size=4096, chunk_size=4096)
+    manifest = backup.verify_backup(os.path.dirname(manifest_path))
+    assert manifest['format'] == backup.FORMAT_SQLITE
+    assert len(manifest['parts']) > 1
+    assert all(os.path.getsize(tmp_path / 'backup' / part['name']) <= 4096 for part in manifest['parts'])
+    assert progress and progress[-1][0] == progress[-1][1]
+
+    target = str(tmp_path / 'restored.db')
+    assert backup.restore_backup(str(tmp_path / 'backup'), target=target) == target
+    restored = location_rows(target)
+    assert len(restored) == 500
+    assert restored == location_rows(source_path(populated))
+
+
+def test_checksum_mismatch_is_rejected(populated, tmp_path):
+    directory = str(tmp_path / 'backup')
+    backup.create_backup(directory=directory, part_size=4096, chunk_size=4096)
+    part = os.path.join(directory, backup.load_manifest(directory)['parts'][1]['name'])
+    with open(part, 'r+b') as f:
+        first = f.read(1)
+        f.seek(0)
+        f.write(bytes([first[0] ^ 0xFF]))
+
+    with pytest.raises(backup.BackupError, match="Checksum mismatch"):
+        backup.verify_backup(directory)
+    target = tmp_path / 'restored.db'
+    with pytest.raises(backup.BackupError):
+        backup.restore_backup(directory, target=str(target))
+    assert not target.exists()
@@ -0,0 +1,71 @@
+"""Memory-mapped contact snapshot (bot.contact_snapshot): lookups and rebuilds on version changes."""
+import types
+
+import pytest
+
+from bot import config, contact_snapshot
+
+TELEGRAM_ID = 1001
+
+
+@pytest.fixture
+def snapshot(db, make_user, tmp_path, monkeypatch):
+    """Two contacts owned by @alice, and the snapshot module pointed at a scratch file."""
+    monkeypatch.setattr(config, 'CONTACT_SNAPSHOT_PATH', str(tmp_path / 'contacts.snap'))
+    user_id = make_user(TELEGRAM_ID, username='alice', first_name='Alice')
+    db.add_location_entry(user_id, '54.0', '-1.5', 'Harrogate')
+    db.add_location_entry(user_id, '53.8', '-1.55', 'Leeds')
+    contact_snapshot.reset()
+    yield contact_snapshot
+    if contact_snapshot._refresher is not None:
+        contact_snapshot._refresher.join()
+    contact_snapshot.reset()
+
+
+def due(module):
+    """Make the next lookup start a version check, and wait for it."""
+    module._next_check = 0.0
+    module.get_snapshot()
+    if module._refresher is not None:
+        module._refresher.join()
+
+
+def test_nearest_contacts(snapshot):
+    assert [phone for _, phone, _ in snapshot.nearest_contacts(53.81, -1.56, 2)] == ['53.8', '54.0']
+    assert snapshot.nearest_contacts(54.0, -1.5)[0][0] == 'alice'
+
+
+def test_new_contact_rebuilds_snapshot(snapshot, db):
+    first = snapshot.get_snapshot()
+    db.add_location_entry(1, '51.5', '-0.12', 'London')
+    # The mapped snapshot is served until the next version check finds it stale
+    assert snapshot.get_snapshot() is first
+    due(snapshot)
+    assert snapshot.get_snapshot() is not first
+    assert snapshot.nearest_contacts(51.5, -0.12)[0][1] == '51.5'
+
+
+def test_searches_do_not_rebuild_snapshot(snapshot, db):
+    first = snapshot.get_snapshot()
+    db.add_location_entry(1, '51.5', '-0.12', 'London', query='london')
+    due(snapshot)
+    assert snapshot.get_snapshot() is first
+
+
+def test_rename_rebuilds_snapshot(snapshot, db):
+    snapshot.get_snapshot()
+    db.ensure_user(types.SimpleNamespace(id=TELEGRAM_ID, username='alice2', first_name='Alice', last_name=None))
+    assert snapshot.nearest_contacts(54.0, -1.5)[0][0] == 'alice'
+    due(snapshot)
+    assert snapshot.nearest_contacts(54.0, -1.5)[0][0] == 'alice2'
+
+
+def test_current_file_from_another_process_is_mapped_without_rebuild(snapshot, monkeypatch):
+    built = snapshot.get_snapshot()
+    snapshot.reset()
+
+    def fail(path=None):
+        raise AssertionError("snapshot rebuilt although the file was current")
+
+    monkeypatch.setattr(snapshot, 'rebuild', fail)
+    assert snapshot.get_snapshot().db_version == built.db_version
@@ -0,0 +1,71 @@
+"""Inline autocomplete index (bot.place_index): what is learned, prefix search and contact seeding."""
+import pytest
+
+from bot.location import GeocodeResult
+from bot.place_index import PlaceIndex
+
+
+@pytest.fixture
+def places_file(tmp_path):
+    return str(tmp_path / 'places.csv')
+
+
+def names(places):
+    return [place.name for place in places]
+
+
+def test_settlements_are_learned_and_persisted(places_file):
+    index = PlaceIndex(places_file)
+    index.learn_geocode("harrogate", GeocodeResult(54.0, -1.54, "Harrogate, North Yorkshire", 'town', "Harrogate"))
+    index.learn_geocode("harrow", GeocodeResult(51.58, -0.34, "Harrow, London", 'suburb', "Harrow"))
+    assert names(index.search("harro")) == ["Harrogate", "Harrow"]
+    assert names(index.search("HARROG")) == ["Harrogate"]
+    # A new process loads what was learned from the places file
+    assert names(PlaceIndex(places_file).search("harr")) == ["Harrogate", "Harrow"]
+
+
+def test_postcode_districts_are_learned(places_file):
+    index = PlaceIndex(places_file)
+    index.learn_geocode("hg1", GeocodeResult(54.0, -1.54, "HG1, Harrogate", 'postcode'))
+    assert names(index.search("hg")) == ["HG1"]
+    assert index.lookup("Hg1").latitude == 54.0
+
+
+@pytest.mark.parametrize('query, result', [
+    ("12 Station Parade", GeocodeResult(54.0, -1.54, "12 Station Parade, Harrogate", 'road', "Station Parade")),
+    ("The Old Vicarage", GeocodeResult(54.0, -1.54, "The Old Vicarage, Harrogate", 'house', "The Old Vicarage")),
+    ("HG1 2RS", GeocodeResult(54.0, -1.54, "HG1 2RS, Harrogate", 'postcode')),
+    ("somewhere", GeocodeResult(54.0, -1.54, "Somewhere")),
+])
+def test_addresses_and_full_postcodes_are_not_learned(places_file, query, result):
+    index = PlaceIndex(places_file)
+    index.learn_geocode(query, result)
+    assert index.search(query[:2]) == []
+    assert PlaceIndex(places_file).search(query[:2]) == []
+
+
+def test_search_limit_and_order(places_file):
+    index = PlaceIndex(places_file)
+    for name in ("Leeds", "Leek", "Leicester", "Leigh", "Lewes"):
+        index.learn(name, 53.0, -1.0)
+    assert names(index.search("le", limit=3)) == ["Leeds", "Leek", "Leicester"]
+    assert names(index.search("lee")) == ["Leeds", "Leek"]
+    assert index.search("x") == []
+
+
+def test_warm_seeds_districts_from_contact_addresses(db, make_user, places_file):
+    user_id = make_user(1001, username='alice')
+    db.add_location_entry(user_id, '54.0', '-1.5', '1 High St, Harrogate, HG1 2RS, United Kingdom')
+    db.add_location_entry(user_id, '54.2', '-1.7', '2 Low St, Harrogate, HG1 5AB, United Kingdom')
+    db.add_location_entry(user_id, '53.8', '-1.55', '3 Park Row, Leeds LS1 5HD')
+    # Searches are not contacts
+    db.add_location_entry(user_id, '51.5', '-0.12', 'Westminster, SW1A 2AA', query='sw1a 2aa')
+
+    index = PlaceIndex(places_file)
+    index.warm().join()
+    assert names(index.search("hg")) == ["HG1"]
+    assert index.lookup("HG1").latitude == pytest.approx(54.1)
+    assert names(index.search("ls")) == ["LS1"]
+    assert index.search("sw") == []
+    # Seeded districts live in memory only
+    assert PlaceIndex(places_file).search("hg") == []
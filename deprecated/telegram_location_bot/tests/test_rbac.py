@@ -0,0 +1,76 @@
+"""Admin set cache in bot.rbac and its invalidation by /promote and /demote."""
+import pytest
+
+ADMIN_ID = 1001
+MEMBER_ID = 2002
+
+
+@pytest.fixture
+def rbac(db, make_user):
+    from bot import rbac
+    make_user(ADMIN_ID, username='boss', is_admin=True)
+    make_user(MEMBER_ID, username='member')
+    rbac._admin_ids = None
+    yield rbac
+    rbac._admin_ids = None
+
+
+@pytest.fixture
+def replies(rbac, monkeypatch):
+    """Texts bot.admin_commands replies with; nothing is sent to Telegram."""
+    from bot import admin_commands, rate_limit
+    sent = []
+    monkeypatch.setattr(admin_commands, 'safe_reply', lambda bot, message, text, **kw: sent.append(text))
+    monkeypatch.setattr(admin_commands.bot, 'send_message', lambda *args, **kw: None)
+    monkeypatch.setattr(rate_limit, '_last_time', {})
+    return sent
+
+
+def run_command(name, text, make_message):
+    from bot import admin_commands, rate_limit
+    rate_limit._last_time.clear()
+    getattr(admin_commands, name)(make_message(text, ADMIN_ID))
+
+
+def test_admin_set_is_cached(rbac, db, monkeypatch):
+    assert rbac.get_admin_ids() == {ADMIN_ID}
+    # Served from memory: a database query would fail now
+    monkeypatch.setattr(db, 'SessionLocal', None)
+    assert rbac.is_user_admin(ADMIN_ID)
+    assert not rbac.is_user_admin(MEMBER_ID)
+
+
+def test_promote_takes_effect_immediately(rbac, replies, make_message):
+    assert not rbac.is_user_admin(MEMBER_ID)
+    run_command('promote_command', f"/promote {MEMBER_ID}", make_message)
+    assert replies[-1].startswith("✅ Promoted")
+    assert rbac.is_user_admin(MEMBER_ID)
+
+
+def test_demote_takes_effect_immediately(rbac, replies, make_message):
+    run_command('promote_command', f"/promote {MEMBER_ID}", make_message)
+    assert rbac.is_user_admin(MEMBER_ID)
+    run_command('demote_command', f"/demote {MEMBER_ID}", make_message)
+    assert "has been demoted" in replies[-1]
+    assert not rbac.is_user_admin(MEMBER_ID)
+
+
+def test_change_from_another_process_is_seen_after_version_check(rbac, db):
+    from admin.models import AuthVersion
+    assert rbac.get_admin_ids() == {ADMIN_ID}
+    # What /promote does in another process: change the row and bump the shared counter
+    session = db.SessionLocal()
+    try:
+        session.query(db.models.User).filter_by(telegram_id=MEMBER_ID).update({'is_admin': True})
+        row = session.get(AuthVersion, rbac.ADMIN_VERSION_KEY)
+        if row is None:
+            session.add(AuthVersion(name=rbac.ADMIN_VERSION_KEY, version=1))
+        else:
+            row.version += 1
+        session.commit()
+    finally:
+        session.close()
+    # Still cached until the next version check is due
+    assert rbac.get_admin_ids() == {ADMIN_ID}
+    rbac._next_version_check = 0.0
+    assert rbac.get_admin_ids() == {ADMIN_ID, MEMBER_ID}
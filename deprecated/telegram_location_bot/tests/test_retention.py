@@ -0,0 +1,122 @@
+"""Search history retention (bot.retention): archive files, daily counts and crash recovery."""
+import csv
+import datetime as dt
+import glob
+import gzip
+import os
+
+import pytest
+
+from bot import config, retention
+
+OLD = dt.datetime.utcnow() - dt.timedelta(days=40)
+RECENT = dt.datetime.utcnow() - dt.timedelta(hours=1)
+
+
+@pytest.fixture
+def history(db, make_user, tmp_path, monkeypatch):
+    """Old and recent searches plus an old contact row; returns the ids of the old searches."""
+    monkeypatch.setattr(config, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    user_id = make_user(1001, username='searcher')
+    session = db.SessionLocal()
+    try:
+        old = [db.models.Location(user_id=user_id, latitude='54.0', longitude='-1.5', address='Harrogate',
+                                  query=f"hg{i}", timestamp=OLD) for i in range(5)]
+        session.add_all(old)
+        session.add(db.models.Location(user_id=user_id, latitude='54.0', longitude='-1.5',
+                                       address='Harrogate', query='recent', timestamp=RECENT))
+        session.add(db.models.Location(user_id=user_id, latitude='54.0', longitude='-1.5',
+                                       address='1 High St, Harrogate', timestamp=OLD))
+        session.commit()
+        return [row.id for row in old]
+    finally:
+        session.close()
+
+
+def hot_queries(db):
+    session = db.SessionLocal()
+    try:
+        return sorted(str(row.query) for row in session.query(db.models.Location).all())
+    finally:
+        session.close()
+
+
+def archive_files(pattern='*.csv.gz'):
+    return sorted(glob.glob(os.path.join(config.ARCHIVE_DIR, 'locations', '*', pattern)))
+
+
+def test_old_searches_move_to_the_archive(history, db):
+    session = db.SessionLocal()
+    try:
+        before = retention.total_searches(session)
+    finally:
+        session.close()
+    assert retention.run_retention(batch_size=2) == 5
+    # Contacts (no query) and recent searches stay hot
+    assert hot_queries(db) == ['None', 'recent']
+    files = archive_files()
+    assert len(files) == 3
+    archived = []
+    for path in files:
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            assert tuple(reader.fieldnames) == retention.ARCHIVE_COLUMNS
+            archived.extend(int(row['id']) for row in reader)
+    assert sorted(archived) == history
+    session = db.SessionLocal()
+    try:
+        assert retention.archived_searches(session) == 5
+        assert retention.total_searches(session) == before == 6
+    finally:
+        session.close()
+
+
+def test_archive_is_published_only_after_delete_commits(history, db, monkeypatch):
+    publish = retention._publish
+    seen = []
+
+    def check_then_publish(paths):
+        # Runs after the transaction: the rows are already gone for other connections
+        seen.append(hot_queries(db))
+        assert archive_files() == []
+        publish(paths)
+
+    monkeypatch.setattr(retention, '_publish', check_then_publish)
+    retention.run_retention()
+    assert seen == [['None', 'recent']]
+    assert len(archive_files()) == 1
+
+
+def test_failed_batch_leaves_no_archive(history, db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(retention, 'upsert_add', fail)
+    with pytest.raises(RuntimeError):
+        retention.run_retention()
+    assert archive_files() == [] and archive_files('*.tmp') == []
+    assert len(hot_queries(db)) == 7
+
+
+def write_pending(first_id, last_id):
+    path = retention._archive_path(OLD.date(), first_id, last_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(f"{path}.tmp", 'wt', encoding='utf-8') as f:
+        f.write("id\n")
+    return path
+
+
+def test_recover_pending_publishes_committed_and_drops_uncommitted(history, db):
+    session = db.SessionLocal()
+    try:
+        session.query(db.models.Location).filter(db.models.Location.id.in_(history[:2])).delete()
+        session.commit()
+    finally:
+        session.close()
+    committed = write_pending(history[0], history[1])
+    uncommitted = write_pending(history[2], history[4])
+
+    assert retention.recover_pending(db.get_engine()) == 2
+    assert os.path.exists(committed)
+    assert not os.path.exists(uncommitted)
+    assert archive_files('*.tmp') == []
@@ -0,0 +1,49 @@
+"""Cold-start budget for the bot process (see bot.bootstrap)."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds; generous for CI machines, override with STARTUP_BUDGET
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", "2.0"))
+
+SCRIPT = """
+import sys, time
+started = time.perf_counter()
+from bot.bootstrap import bootstrap
+timings = bootstrap(create_schema=False, init_admin=False)
+print(time.perf_counter() - started)
+print(sum(seconds for _, seconds in timings))
+print(' '.join(name for name in ('flask', 'admin.routes') if name in sys.modules) or '-')
+"""
+
+
+@pytest.fixture
+def cold_start(tmp_path):
+    """Bootstrap a worker-style process in a fresh interpreter and return its measurements."""
+    env = dict(os.environ)
+    env.update({
+        'BOT_TOKEN': '123456:TEST',
+        'DATABASE_URL': f"sqlite:///{tmp_path / 'startup.db'}",
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT], cwd=PROJECT_DIR, env=env,
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    wall, phases, heavy = result.stdout.splitlines()[-3:]
+    return float(wall), float(phases), [name for name in heavy.split() if name != '-']
+
+
+def test_cold_start_within_budget(cold_start):
+    wall, phases, _ = cold_start
+    assert phases <= STARTUP_BUDGET, f"bootstrap phases took {phases:.2f}s (budget {STARTUP_BUDGET:.2f}s)"
+    assert wall <= STARTUP_BUDGET, f"cold start took {wall:.2f}s (budget {STARTUP_BUDGET:.2f}s)"
+
+
+def test_bootstrap_does_not_import_admin_panel(cold_start):
+    _, _, heavy = cold_start
+    assert heavy == [], f"bot bootstrap imported {', '.join(heavy)}"
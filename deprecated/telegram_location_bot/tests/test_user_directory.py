@@ -0,0 +1,126 @@
+"""Admin user directory (bot.user_directory): indexed search, pagination and bulk actions."""
+import types
+
+import pytest
+from sqlalchemy import text
+
+from bot import config, user_directory
+
+
+@pytest.fixture
+def users(db, make_user):
+    """A small directory; returns {username: user id}."""
+    people = [
+        (101, 'alice', 'Alice', 'Smith', True),
+        (102, 'Alfred', 'Alfred', 'Jones', False),
+        (103, 'bob', 'Bob', 'Smithers', True),
+        (104, 'carol', 'John', 'Smyth', False),
+        (105, 'dave', 'John', 'Black', False),
+    ]
+    return {username: make_user(telegram_id, username=username, first_name=first, last_name=last, is_admin=admin)
+            for telegram_id, username, first, last, admin in people}
+
+
+def found(db, **filters):
+    session = db.SessionLocal()
+    try:
+        rows, _ = user_directory.search(session, **filters)
+        return [user.username for user, _ in rows]
+    finally:
+        session.close()
+
+
+def flags(db, user_id):
+    session = db.SessionLocal()
+    try:
+        user = session.get(db.models.User, user_id)
+        return user.is_admin, user.is_active
+    finally:
+        session.close()
+
+
+def test_search_by_name_prefix(users, db):
+    assert found(db, text="AL") == ['alice', 'Alfred']
+    assert found(db, text="@bo") == ['bob']
+    assert found(db, text="smi") == ['alice', 'bob']
+    assert found(db, text="john sm") == ['carol']
+    assert found(db, text="104") == ['carol']
+    assert found(db, text="al", is_admin=True) == ['alice']
+
+
+def test_search_pages_with_a_cursor(users, db):
+    session = db.SessionLocal()
+    try:
+        seen = []
+        after_id = None
+        while True:
+            rows, after_id = user_directory.search(session, after_id=after_id, limit=2)
+            seen.append([user.username for user, _ in rows])
+            if after_id is None:
+                break
+    finally:
+        session.close()
+    assert seen == [['alice', 'Alfred'], ['bob', 'carol'], ['dave']]
+
+
+def test_find_by_username_uses_the_index_and_follows_renames(users, db):
+    session = db.SessionLocal()
+    try:
+        assert user_directory.find_by_username(session, '@ALICE').id == users['alice']
+        plan = session.execute(text("EXPLAIN QUERY PLAN SELECT id FROM users WHERE lower(username) = 'alice'")).all()
+        assert any('ix_users_lower_username' in str(row) for row in plan)
+        session.get(db.models.User, users['alice']).username = 'alicia'
+        session.commit()
+        assert user_directory.find_by_username(session, 'alice') is None
+        assert user_directory.find_by_username(session, 'Alicia').id == users['alice']
+    finally:
+        session.close()
+
+
+def test_seen_filters(users, db, monkeypatch):
+    monkeypatch.setattr(user_directory, '_last_seen_written', {})
+    db.ensure_user(types.SimpleNamespace(id=101, username='alice', first_name='Alice', last_name='Smith'))
+    assert found(db, text="al", never_seen=True) == ['Alfred']
+    assert found(db, text="al", seen_since=user_directory.dt.datetime(2000, 1, 1)) == ['alice']
+
+
+@pytest.fixture
+def revocations(monkeypatch):
+    """Calls bulk actions make to revoke sessions and drop the admin cache."""
+    from bot import auth_versions, rbac
+    calls = {'bumped': [], 'invalidated': 0}
+    monkeypatch.setattr(auth_versions, 'bump_users', lambda ids: calls['bumped'].append(sorted(ids)))
+
+    def invalidate():
+        calls['invalidated'] += 1
+
+    monkeypatch.setattr(rbac, 'invalidate_admin_cache', invalidate)
+    return calls
+
+
+def test_bulk_deactivate_bumps_only_admins(users, db, revocations, monkeypatch):
+    monkeypatch.setattr(config, 'USER_BULK_BATCH_SIZE', 2)
+    changed = user_directory.apply_action('deactivate', users.values(), exclude_ids=[users['dave']])
+    assert changed == 4
+    assert revocations['bumped'] == [[users['alice']], [users['bob']]]
+    assert revocations['invalidated'] == 1
+    assert flags(db, users['alice']) == (True, False)
+    assert flags(db, users['dave']) == (False, True)
+    # Nothing changes the second time, so nothing is revoked
+    assert user_directory.apply_action('deactivate', users.values(), exclude_ids=[users['dave']]) == 0
+    assert revocations['invalidated'] == 1
+
+
+def test_bulk_activate_does_not_revoke_sessions(users, db, revocations):
+    user_directory.apply_action('deactivate', [users['carol']])
+    assert revocations == {'bumped': [], 'invalidated': 0}
+    assert user_directory.apply_action('activate', users.values()) == 1
+    assert revocations == {'bumped': [], 'invalidated': 0}
+
+
+def test_bulk_demote_matching_filters(users, db, revocations, monkeypatch):
+    monkeypatch.setattr(config, 'USER_BULK_BATCH_SIZE', 1)
+    assert user_directory.apply_action_to_matching('demote', text="smi") == 2
+    assert sorted(sum(revocations['bumped'], [])) == sorted([users['alice'], users['bob']])
+    assert revocations['invalidated'] == 1
+    assert found(db, is_admin=True) == []